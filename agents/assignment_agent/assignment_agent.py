@@ -1,18 +1,64 @@
 import json
+import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 sys.path.append("/Users/risaonishi/Downloads/CS/swe-agent/agents")
 from agents.node import Node
+from agents.assignment_agent.keyword_classifier import KeywordClassifier, CATEGORIES
+from shared.cache_tools import ClassificationCache
 
 
 # === Classification agent class ===
 class AssignmentAgent(Node):
-    def __init__(self, model_name, backend, sys_msg=""):
-        super().__init__(model_name, backend, sys_msg)
+    def __init__(self, model_name, backend, sys_msg="", cache=None, pre_classifier=None, confidence_threshold=0.8):
+        # every classification stands on its own, no history is sent with it
+        super().__init__(model_name, backend, sys_msg, stateless=True)
+        self.cache = cache  # optional ClassificationCache consulted before asking the model
+        self.pre_classifier = pre_classifier  # optional KeywordClassifier tried before the cache and the model
+        self.confidence_threshold = confidence_threshold  # pre-classifier answers below this go to the model
+        self.llm_calls_avoided = 0
+        self.latencies = {}  # task id -> seconds spent classifying it in the last run
+
+    def pre_classify(self, description):
+        """
+        Returns the pre-classifier's category if it is confident enough, otherwise None
+        """
+        if self.pre_classifier is None:
+            return None
+        category, confidence = self.pre_classifier.predict(description)
+        if confidence < self.confidence_threshold:
+            return None
+        self.llm_calls_avoided += 1
+        return category
+
+    def _cache_key(self, description):
+        return self.cache.make_key(self.model_name, self.sys_msg, description)
 
     def classify_task(self, task_id, description):
         """
         Classify a single task as either 'regular_model' or 'thinking_model'
         """
+        category = self.pre_classify(description)
+        if category is not None:
+            return category
+
+        if self.cache is not None:
+            category = self.cache.get(self._cache_key(description))
+            if category is not None:
+                return category
+
+        category = self._ask_category(task_id, description)
+
+        if self.cache is not None:
+            self.cache.put(self._cache_key(description), category)
+
+        return category
+
+    def _ask_category(self, task_id, description):
+        """
+        Asks the model for the category of a single task, bypassing the cache
+        """
         prompt = f"""
                 You are a task classifier. You can only reply with one word.
 
@@ -27,29 +73,181 @@ class AssignmentAgent(Node):
                 {task_id}: {description}
                 """
 
-        category = self.instruct(prompt).strip().replace('"', '')
+        # the answer is constrained to the two categories and stops right after it
+        category = self.ask_choice(prompt, CATEGORIES, stage="classify_task")
 
-        if category not in {"regular_model", "thinking_model"}:
-            raise ValueError(f"Invalid category '{category}' returned for task {task_id}")
+        if category is None:
+            raise ValueError(f"Invalid category returned for task {task_id}")
         
         return category
 
-    def classify_task_list(self, task_list):
-        result = {"regular_model": [], "thinking_model": []}
+    def classify_task_batch(self, tasks):
+        """
+        Classify several tasks with a single prompt.
+        Returns a dict of task id -> category for every task the model answered with a valid category,
+        tasks that are missing from the answer or have an invalid category are left out
+        """
+        task_lines = "\n".join(f"{task['id']}: {task['description']}" for task in tasks)
+        prompt = f"""
+                You are a task classifier. You can only reply with a JSON object.
+
+                Classify each task as:
+                - "regular_model" for simple tasks (e.g. UI layout, static styling, project setup)
+                - "thinking_model" for complex tasks (e.g. backend logic, authentication, APIs, or DB work)
+
+                Return **only** a JSON object mapping every task id to its category, for example:
+                {{"1": "regular_model", "2": "thinking_model"}}
+                Do **not** include explanations or reasoning. You will be punished for including additional reasoning in your answer.
+
+                Tasks:
+                {task_lines}
+                """
+
+        # enough tokens for every id and category, with a schema the backend only produces valid categories
+        options = {"num_predict": 16 * len(tasks) + 16, "temperature": 0}
+        if self.client.supports_format:
+            ids = [str(task["id"]) for task in tasks]
+            schema = {"type": "object", "properties": {task_id: {"type": "string", "enum": list(CATEGORIES)}
+                                                       for task_id in ids},
+                      "required": ids}
+            response = self.ask(prompt, stage="classify_task_batch", format=schema, options=options)
+        else:
+            response = self.ask(prompt, stage="classify_task_batch", options=options)
+        answer = self._extract_json_object(response)
+        if answer is None:
+            raise ValueError(f"No JSON object returned for batch of {len(tasks)} tasks")
+
+        categories = {}
+        for task in tasks:
+            category = answer.get(str(task["id"]))
+            if isinstance(category, str):
+                category = category.strip().replace('"', '')
+            if category in CATEGORIES:
+                categories[task["id"]] = category
 
+        return categories
+
+    def _extract_json_object(self, response):
+        """
+        Returns the first JSON object found in the response, or None if there is none
+        """
+        match = re.search(r"\{[\s\S]*\}", response)
+        if not match:
+            return None
+        try:
+            answer = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+        return answer if isinstance(answer, dict) else None
+
+    def _classify_chunk(self, tasks):
+        """
+        Classify a chunk of tasks in one prompt. Tasks whose answers fail validation are
+        split in half and retried, a single leftover task falls back to classify_task
+        """
+        if len(tasks) == 1:
+            task = tasks[0]
+            try:
+                return {task["id"]: self._ask_category(task["id"], task["description"])}
+            except Exception as e:
+                print(f"✗ Failed to classify task {task['id']}: {e}")
+                return {}
+
+        try:
+            categories = self.classify_task_batch(tasks)
+        except Exception as e:
+            print(f"✗ Failed to classify batch of {len(tasks)} tasks: {e}")
+            categories = {}
+
+        failed = [task for task in tasks if task["id"] not in categories]
+        if failed:
+            middle = (len(failed) + 1) // 2
+            for half in (failed[:middle], failed[middle:]):
+                if half:
+                    categories.update(self._classify_chunk(half))
+
+        return categories
+
+    def iter_classify_task_list(self, task_list, batch_size=1, max_workers=1):
+        """
+        Classify every task in the list, yielding (task, category) as soon as each task is classified.
+        With batch_size > 1 the tasks are packed batch_size at a time into a single prompt,
+        with max_workers > 1 up to max_workers prompts are sent to the model server at once.
+        The latency of each task is stored in self.latencies and tasks that fail are not yielded.
+        Tasks the pre-classifier is confident about or that are found in self.cache are not sent to the model
+        """
+        run_start = time.perf_counter()
+        valid_tasks = []
         for task in task_list:
             task_id = task.get("id")
             desc = task.get("description")
             if not task_id or not desc:
                 print(f"Skipping invalid task: {task}")
                 continue
+            valid_tasks.append(task)
 
-            try:
-                category = self.classify_task(task_id, desc)
+        self.latencies = {}
+        avoided_before = self.llm_calls_avoided
+        uncached_tasks = []
+        for task in valid_tasks:
+            source = "keywords"
+            category = self.pre_classify(task["description"])
+            if category is None and self.cache is not None:
+                source = "cached"
+                category = self.cache.get(self._cache_key(task["description"]))
+            if category is None:
+                uncached_tasks.append(task)
+            else:
+                self.latencies[task["id"]] = 0.0
+                print(f"✓ Task {task['id']} → {category} ({source})")
+                yield task, category
+
+        chunk_size = max(1, batch_size)
+        chunks = [uncached_tasks[i:i + chunk_size] for i in range(0, len(uncached_tasks), chunk_size)]
+
+        def classify_chunk(chunk):
+            start = time.perf_counter()
+            categories = self._classify_chunk(chunk)
+            return chunk, categories, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [pool.submit(classify_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                chunk, chunk_categories, latency = future.result()
+                for task in chunk:
+                    if task["id"] in chunk_categories:
+                        category = chunk_categories[task["id"]]
+                        if self.cache is not None:
+                            self.cache.put(self._cache_key(task["description"]), category)
+                        self.latencies[task["id"]] = latency
+                        print(f"✓ Task {task['id']} → {category} ({latency:.2f}s)")
+                        yield task, category
+
+        elapsed = time.perf_counter() - run_start
+        if self.latencies:
+            average = sum(self.latencies.values()) / len(self.latencies)
+            print(f"Classified {len(self.latencies)}/{len(valid_tasks)} tasks in {elapsed:.2f}s "
+                  f"(avg {average:.2f}s, max {max(self.latencies.values()):.2f}s per task)")
+        if self.pre_classifier is not None:
+            print(f"Pre-classifier avoided {self.llm_calls_avoided - avoided_before} LLM calls")
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"Classification cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+    def classify_task_list(self, task_list, batch_size=1, max_workers=1):
+        """
+        Classify every task in the list into the regular_model / thinking_model buckets.
+        Takes the same options as iter_classify_task_list, the buckets keep the input order
+        """
+        categories = {}
+        for task, category in self.iter_classify_task_list(task_list, batch_size, max_workers):
+            categories[task["id"]] = category
+
+        result = {"regular_model": [], "thinking_model": []}
+        for task in task_list:
+            category = categories.get(task.get("id"))
+            if category is not None:
                 result[category].append(task)
-                print(f"✓ Task {task_id} → {category}")
-            except Exception as e:
-                print(f"✗ Failed to classify task {task_id}: {e}")
 
         return result
 
@@ -59,6 +257,8 @@ if __name__ == "__main__":
     import os
     MODEL = "cogito:3b"
     BACKEND = "ollama"
+    BATCH_SIZE = 10
+    MAX_WORKERS = 4
     PROMPT = """
                 You are a task classifier. You can only reply with one word.
 
@@ -77,10 +277,12 @@ if __name__ == "__main__":
     with open(task_list_path, "r") as f:
         task_list = json.load(f)
 
-    agent = AssignmentAgent(MODEL, BACKEND, PROMPT)
+    agent = AssignmentAgent(MODEL, BACKEND, PROMPT,
+                            cache=ClassificationCache(os.path.join(project_dir, "cache/classifications.db")),
+                            pre_classifier=KeywordClassifier())
 
     print("=== Assigning Tasks ===")
-    result = agent.classify_task_list(task_list)
+    result = agent.classify_task_list(task_list, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS)
 
     # Save to file
     output_path = os.path.join(project_dir, "tests/model_assignment.json")
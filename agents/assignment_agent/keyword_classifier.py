@@ -0,0 +1,91 @@
+import re
+import json
+import math
+from collections import Counter
+
+# Positive weights push a task towards "thinking_model", negative weights towards "regular_model"
+DEFAULT_KEYWORD_WEIGHTS = {
+    # backend / API / data work
+    "api": 2.0, "endpoint": 2.5, "backend": 2.5, "server": 2.0, "database": 2.5, "db": 2.5,
+    "schema": 2.0, "postgresql": 2.5, "mysql": 2.5, "mongodb": 2.5, "sql": 2.5, "query": 2.0,
+    "migration": 2.0, "auth": 2.5, "authentication": 2.5, "authorization": 2.5, "login": 2.0,
+    "signup": 2.0, "registration": 2.0, "password": 2.0, "hashing": 2.5, "bcrypt": 2.5,
+    "jwt": 2.5, "oauth": 2.5, "session": 2.0, "token": 1.5, "payment": 2.5, "stripe": 2.5,
+    "checkout": 1.5, "middleware": 2.5, "express": 2.0, "django": 2.0, "flask": 2.0,
+    "restful": 2.5, "rest": 2.0, "graphql": 2.5, "websocket": 2.5, "integrate": 1.5,
+    "integration": 1.5, "crm": 2.0, "gateway": 2.0, "proxy": 2.0, "nginx": 2.0, "docker": 2.0,
+    "dockerfile": 2.0, "containerizing": 2.0, "terraform": 2.5, "aws": 2.0, "ec2": 2.0, "s3": 2.0,
+    "deploy": 1.5, "deployment": 1.5, "pipeline": 1.5, "ci": 1.5, "cd": 1.5, "infrastructure": 2.0,
+    "security": 2.0, "encryption": 2.5, "cache": 1.5, "inventory": 1.5,
+    # UI / styling / setup work
+    "ui": -2.5, "layout": -2.5, "style": -2.5, "styling": -2.5, "css": -2.5, "tailwind": -2.5,
+    "flexbox": -2.5, "grid": -2.0, "responsive": -2.5, "navbar": -2.5, "footer": -2.5,
+    "header": -2.0, "homepage": -2.0, "landing": -2.0, "page": -1.0, "button": -2.0,
+    "dropdown": -2.0, "menu": -2.0, "menus": -2.0, "modal": -2.0, "icon": -2.0, "font": -2.5,
+    "color": -2.5, "theme": -2.0, "dark": -1.5, "toggle": -1.0, "animation": -2.0,
+    "design": -1.5, "static": -2.5, "component": -1.0, "image": -1.5, "banner": -2.0,
+    "readme": -2.5, "setup": -1.0, "scaffold": -2.0, "lint": -2.0, "prettier": -2.5,
+}
+
+CATEGORIES = ("regular_model", "thinking_model")
+
+def tokenize(text):
+    """
+    Lowercases the text and splits it into alphanumeric words.
+    """
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class KeywordClassifier:
+    """
+    Zero-LLM pre-classifier for task descriptions.
+    Sums per-word weights into a score, the sign picks the category and the
+    magnitude gives the confidence. Weights start from DEFAULT_KEYWORD_WEIGHTS and
+    can be refined with labelled assignments such as tests/model_assignment.json.
+    """
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_KEYWORD_WEIGHTS if weights is None else weights)
+
+    @classmethod
+    def from_assignment_file(cls, path, weights=None):
+        """
+        Builds a classifier from the default weights refined by a saved assignment file.
+        """
+        with open(path, "r") as f:
+            assignments = json.load(f)
+        classifier = cls(weights)
+        classifier.fit(assignments)
+        return classifier
+
+    def fit(self, assignments, scale=1.0):
+        """
+        Adds the smoothed log-likelihood ratio of every word seen in the labelled
+        assignments ({"regular_model": [tasks], "thinking_model": [tasks]}) to its weight.
+        """
+        counts = {category: Counter() for category in CATEGORIES}
+        totals = {category: 0 for category in CATEGORIES}
+        for category in CATEGORIES:
+            for task in assignments.get(category, []):
+                counts[category].update(set(tokenize(task.get("description", ""))))
+                totals[category] += 1
+
+        vocabulary = set(counts["regular_model"]) | set(counts["thinking_model"])
+        for word in vocabulary:
+            p_thinking = (counts["thinking_model"][word] + 1) / (totals["thinking_model"] + 2)
+            p_regular = (counts["regular_model"][word] + 1) / (totals["regular_model"] + 2)
+            self.weights[word] = self.weights.get(word, 0.0) + scale * math.log(p_thinking / p_regular)
+
+    def score(self, description):
+        """
+        Returns the summed weight of the description, > 0 leans thinking_model and < 0 regular_model.
+        """
+        return sum(self.weights.get(word, 0.0) for word in set(tokenize(description)))
+
+    def predict(self, description):
+        """
+        Returns (category, confidence) where confidence is in [0.5, 1).
+        """
+        score = self.score(description)
+        category = "thinking_model" if score > 0 else "regular_model"
+        confidence = 1 / (1 + math.exp(-abs(score)))
+        return category, confidence
@@ -0,0 +1,156 @@
+import time
+import asyncio
+import threading
+import ollama
+from concurrent.futures import ThreadPoolExecutor
+from smolagents import HfApiModel
+
+"""
+    LLM backends the agents talk to through Node.
+    Every backend answers chat(model, messages, **kwargs) with an ollama style response,
+    {"message": {"role", "content"}, "prompt_eval_count", "eval_count", ...}, so agents and
+    the timing spans do not care which backend produced it. On top of chat each backend has
+    achat (asyncio), stream (yields partial responses, the last one has done=True and the
+    token counts) and batch (several conversations at once).
+"""
+
+class Backend:
+    name = ""
+    supports_format = False  # chat accepts format= with "json" or a JSON schema the answer must follow
+
+    def chat(self, model, messages, **kwargs):
+        raise NotImplementedError
+
+    async def achat(self, model, messages, **kwargs):
+        return await asyncio.to_thread(self.chat, model, messages, **kwargs)
+
+    def stream(self, model, messages, **kwargs):
+        """
+        Yields the response in pieces, backends without streaming yield it whole.
+        """
+        response = self.chat(model, messages, **kwargs)
+        yield dict(response, done=True)
+
+    def batch(self, model, conversations, max_workers=4, **kwargs):
+        """
+        Runs one chat per conversation concurrently and returns the responses in order.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda messages: self.chat(model, messages, **kwargs), conversations))
+
+    def warm(self, model, keep_alive=None):
+        """
+        Loads the model ahead of the first call.
+        """
+        pass
+
+
+class OllamaBackend(Backend):
+    name = "ollama"
+    supports_format = True
+
+    def __init__(self, host=None):
+        self.host = host
+        # the module level client unless a host is given, so OLLAMA_HOST keeps working
+        self.client = ollama.Client(host) if host else ollama
+
+    def chat(self, model, messages, **kwargs):
+        return self.client.chat(model=model, messages=messages, **kwargs)
+
+    async def achat(self, model, messages, **kwargs):
+        return await ollama.AsyncClient(self.host).chat(model=model, messages=messages, **kwargs)
+
+    def stream(self, model, messages, **kwargs):
+        yield from self.client.chat(model=model, messages=messages, stream=True, **kwargs)
+
+    def warm(self, model, keep_alive=None):
+        self.client.generate(model=model, prompt="", keep_alive=keep_alive)
+
+    def create(self, model, from_, system):
+        return self.client.create(model=model, from_=from_, system=system)
+
+
+class HuggingFaceBackend(Backend):
+    name = "huggingface"
+
+    def __init__(self, max_new_tokens=1000):
+        self.max_new_tokens = max_new_tokens
+        self.models = {}  # model id -> HfApiModel
+        self.lock = threading.Lock()
+
+    def _model(self, model):
+        with self.lock:
+            if model not in self.models:
+                self.models[model] = HfApiModel(model_id=model, max_new_tokens=self.max_new_tokens)
+            return self.models[model]
+
+    def chat(self, model, messages, **kwargs):
+        # ollama only options such as keep_alive, format or tools do not apply here
+        hf_model = self._model(model)
+        response = hf_model([{"role": message["role"], "content": message["content"]} for message in messages])
+        return {"model": model, "message": {"role": "assistant", "content": response.content}, "done": True,
+                "prompt_eval_count": getattr(hf_model, "last_input_token_count", None),
+                "eval_count": getattr(hf_model, "last_output_token_count", None)}
+
+
+class FakeBackend(Backend):
+    """
+    Deterministic in-process backend for tests and benchmarks.
+    Answers with responder(messages) if given, otherwise cycles through responses, otherwise
+    echoes the last message. delay seconds per call (plus per response token with
+    tokens_per_sec) stand in for the model, token counts are whitespace separated words.
+    """
+    name = "fake"
+
+    def __init__(self, responses=None, responder=None, delay=0.0, tokens_per_sec=None):
+        self.responses = list(responses or [])
+        self.responder = responder
+        self.delay = delay
+        self.tokens_per_sec = tokens_per_sec
+        self.calls = []  # (model, messages, kwargs) of every call
+        self.lock = threading.Lock()
+
+    def _content(self, messages):
+        with self.lock:
+            index = len(self.calls)
+        if self.responder is not None:
+            return self.responder(messages)
+        if self.responses:
+            return self.responses[index % len(self.responses)]
+        return messages[-1]["content"]
+
+    def chat(self, model, messages, **kwargs):
+        content = self._content(messages)
+        with self.lock:
+            self.calls.append((model, messages, kwargs))
+        prompt_tokens = sum(len((message.get("content") or "").split()) for message in messages)
+        response_tokens = len(content.split())
+        eval_time = response_tokens / self.tokens_per_sec if self.tokens_per_sec else 0
+        time.sleep(self.delay + eval_time)
+        return {"model": model, "message": {"role": "assistant", "content": content}, "done": True,
+                "prompt_eval_count": prompt_tokens, "eval_count": response_tokens,
+                "load_duration": 0, "eval_duration": int(eval_time * 1e9)}
+
+    def stream(self, model, messages, **kwargs):
+        response = self.chat(model, messages, **kwargs)
+        words = response["message"]["content"].split(" ")
+        for i, word in enumerate(words):
+            yield {"model": model, "message": {"role": "assistant", "content": word if i == 0 else " " + word},
+                   "done": False}
+        yield dict(response, message={"role": "assistant", "content": ""})
+
+
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "huggingface": HuggingFaceBackend,
+    "fake": FakeBackend,
+}
+
+def get_backend(backend, **kwargs):
+    """
+    Returns the backend instance for a name in BACKENDS, an instance is returned as is.
+    """
+    if isinstance(backend, Backend):
+        return backend
+    assert backend in BACKENDS, f"Unsupported backend: {backend}"
+    return BACKENDS[backend](**kwargs)
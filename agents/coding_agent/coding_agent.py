@@ -1,16 +1,23 @@
 import sys
-import ollama 
 import json
 import logging
 import re
 import subprocess
 import os
+import difflib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from agents.node import Node
+from agents.coding_agent.stream_parser import CodeStreamParser
+from agents.coding_agent.context_window import relevant_windows, render_windows
+from agents.coding_agent.edit_plan import EDIT_PLAN_SCHEMA, parse_edit_plan, validate_edit_plan, apply_edit_plan
+from shared.timing_tools import current_span_labels, span_labels
 from typing import Dict, List
 from datetime import datetime
 from shared.ollama_tools.ollama_tools import generate_function_description, use_tools
 from shared.github_tools import ensure_repo_cloned,clone_repo, repo_to_fileTree 
-from shared.file_tools import fetch_files_from_codebase, edit_files_from_codebase, create_file
+from shared.file_tools import fetch_files_from_codebase, edit_files_from_codebase, create_file, PathIndex
+from shared.patch_tools import parse_patch, apply_patch, format_rejections, write_atomic
 from shared.shell_tools import open_subprocess, run_command, retrieve_subprocess_output
 
 tools = [
@@ -22,8 +29,9 @@ tools = [
 class CodingAgent(Node):
     def __init__(self, model_name, backend, sys_msg, correction_prompt, 
                  task_analysis_prompt, line_identification_prompt, action_selection_prompt,
-                 replace_content_prompt, add_content_prompt, new_file_prompt):
-        super().__init__(model_name, backend, sys_msg)
+                 replace_content_prompt, add_content_prompt, new_file_prompt, edit_plan_prompt=None, patch_prompt=None,
+                 max_file_lines=300, keep_alive="30m"):
+        super().__init__(model_name, backend, sys_msg, keep_alive=keep_alive)
 
         # intialize attributes for intermediate steps such as models
         self.correction_prompt = correction_prompt
@@ -33,14 +41,44 @@ class CodingAgent(Node):
         self.replace_content_prompt = replace_content_prompt
         self.add_content_prompt = add_content_prompt
         self.new_file_prompt = new_file_prompt
-
-    def analyze_task(self, file_tree: str, task: str, max_tries: int = 5) -> Dict[str, List[str]]:
+        self.edit_plan_prompt = edit_plan_prompt  # single call edit plan, the step by step chain is used without it
+        self.patch_prompt = patch_prompt  # the model answers with a patch of the changed regions, tried first
+        self.max_file_lines = max_file_lines  # longer files are shown to the modify steps as relevant windows
+        self.on_token = None  # called with every streamed piece of a generated file, e.g. to print it
+        self._token_buffers = threading.local()  # pieces a worker of execute_task holds back until its file is done
+        self._token_lock = threading.Lock()
+        self._path_indexes = {}  # repository directory or file tree -> PathIndex
+        self._path_index_lock = threading.Lock()
+
+    def path_index(self, file_tree: str, base_path: str = "") -> PathIndex:
+        """
+        Index of the repository's files, built once per repository and reused by later tasks.
+        It is read from the base path directory if there is one, otherwise from the file tree.
+        
+        Args:
+            file_tree: ASCII representation of the file tree
+            base_path: Base path of the repository
+            
+        Returns:
+            PathIndex: the repository's path index
+        """
+        from_directory = bool(base_path) and os.path.isdir(base_path)
+        root = os.path.basename(os.path.abspath(base_path)) if base_path else None
+        key = ("directory", os.path.abspath(base_path)) if from_directory else ("tree", root, file_tree)
+        with self._path_index_lock:
+            if key not in self._path_indexes:
+                self._path_indexes[key] = (PathIndex.from_directory(base_path) if from_directory
+                                           else PathIndex.from_file_tree(file_tree, root=root))
+            return self._path_indexes[key]
+
+    def analyze_task(self, file_tree: str, task: str, max_tries: int = 5, path_index: PathIndex = None) -> Dict[str, List[str]]:
         """
         Main function that analyzes a task and determines all necessary file actions.
         
         Args:
             file_tree (str): ASCII representation of the file tree
             task (str): Description of the task to be performed
+            path_index (PathIndex): Index of the repository's files, built from the file tree if not given
             
         Returns:
             Dict[str, List[str]]: Dictionary containing all file actions needed
@@ -54,8 +92,8 @@ class CodingAgent(Node):
         max_retries = 3
         while retry_count < max_retries:
             try:
-                response = ollama.chat(
-                    model=self.model_name,
+                response = self._chat(
+                    "analyze_task",
                     messages=[{'role': role, 'content': content} for role, content in messages]
                 )
 
@@ -67,30 +105,21 @@ class CodingAgent(Node):
                 if result is None:
                     raise json.JSONDecodeError("Could not extract valid JSON", content, 0)
 
-                # Separate paths into modify and create based on existence in file tree
+                # Separate paths into modify and create based on existence in the repository
+                index = path_index if path_index is not None else self.path_index(file_tree)
                 modify_paths = []
                 create_paths = []
                 
                 for path in result:
-                    # Check if file exists in file tree with various path formats
-                    path_found = False
-                    
-                    # Try exact match
-                    if path in file_tree:
-                        path_found = True
-                    
-                    # Try checking each line
-                    if not path_found:
-                        for line in file_tree.split('\n'):
-                            if path in line or path.split('/')[-1] in line:
-                                path_found = True
-                                break
-                    
-                    if path_found:
-                        modify_paths.append(path)
-                    else:
+                    # Existing files are returned as their path in the repository, so two
+                    # spellings of the same file are only edited once
+                    indexed_path = index.lookup(path)
+                    if indexed_path is not None:
+                        if indexed_path not in modify_paths:
+                            modify_paths.append(indexed_path)
+                    elif PathIndex.normalize(path) not in create_paths:
                         logging.info(f"Path {path} not found in file tree, will be created")
-                        create_paths.append(path)
+                        create_paths.append(PathIndex.normalize(path))
 
                 return {
                     "modify": modify_paths,
@@ -226,12 +255,15 @@ class CodingAgent(Node):
         Raises:
             ValueError: If the resolved path is outside the base directory
         """
-        # Convert to absolute paths
+        # Convert to absolute paths, relative paths in the form the path index uses
         abs_base = os.path.abspath(base_path)
-        abs_path = os.path.abspath(os.path.join(base_path, file_path))
+        if os.path.isabs(file_path):
+            abs_path = os.path.abspath(file_path)
+        else:
+            abs_path = os.path.abspath(os.path.join(abs_base, PathIndex.normalize(file_path)))
         
         # Check if the resolved path is within the base directory
-        if not abs_path.startswith(abs_base):
+        if os.path.commonpath([abs_base, abs_path]) != abs_base:
             raise ValueError(f"Path {file_path} resolves outside base directory {base_path}")
             
         return abs_path
@@ -255,18 +287,55 @@ class CodingAgent(Node):
             # For existing files, use bounded modification approach
             return self._modify_existing_file(task, file_path, existing_content)
 
-        response = ollama.chat(
-            model=self.model_name,
+        # Stream the response and stop generating as soon as END_CODE arrives,
+        # whatever the model would have added after it is never generated
+        parser = CodeStreamParser()
+        stream = self._stream(
+            "generate_file_content",
             messages=[{'role': 'user', 'content': prompt}]
         )
+        try:
+            for chunk in stream:
+                piece = chunk['message']['content']
+                self._emit_token(piece)
+                if parser.feed(piece):
+                    break
+        finally:
+            stream.close()
         
         # Parse the structured response
-        raw_content = response['message']['content']
-        return self._extract_code_from_response(raw_content)
+        if parser.code:
+            return parser.code
+        return self._extract_code_from_response(parser.text)
     
+    def _emit_token(self, piece: str):
+        """
+        Passes a streamed piece to on_token, or holds it back if the current thread buffers its output.
+        """
+        if self.on_token is None:
+            return
+        buffer = getattr(self._token_buffers, "pieces", None)
+        if buffer is not None:
+            buffer.append(piece)
+        else:
+            self.on_token(piece)
+
+    def _flush_tokens(self):
+        """
+        Passes the pieces the current thread held back to on_token in one go.
+        """
+        buffer = getattr(self._token_buffers, "pieces", None)
+        if not buffer or self.on_token is None:
+            return
+        with self._token_lock:
+            self.on_token(''.join(buffer))
+        buffer.clear()
+
     def _modify_existing_file(self, task: str, file_path: str, existing_content: str) -> str:
         """
-        Modifies existing file content using a simple multi-step approach.
+        Modifies existing file content with a patch of the changed regions, else a single
+        edit plan call, else a simple multi-step approach. Each is skipped without its
+        prompt and the next one is used if the answer can not be applied.
         
         Args:
             task: The task description
@@ -276,18 +345,122 @@ class CodingAgent(Node):
         Returns:
             str: Modified file content
         """
+        if self.patch_prompt:
+            new_content = self._patch_file(task, file_path, existing_content)
+            if new_content is not None:
+                return new_content
+            logging.warning(f"Patch for {file_path} could not be applied")
+
+        if self.edit_plan_prompt:
+            hunks = self._plan_edits(task, file_path, existing_content)
+            if hunks is not None:
+                return apply_edit_plan(existing_content, hunks)
+            logging.warning(f"No valid edit plan for {file_path}, modifying it step by step")
+
+        # Every step starts with the same file message, so ollama only evaluates the
+        # file once and the later steps reuse it from the prompt cache
         # Step 1: Identify WHERE to modify (just line numbers)
         target_line = self._identify_target_line(task, file_path, existing_content)
         
         # Step 2: Determine WHAT ACTION to take (simplified choices)
-        action = self._determine_action(task, target_line, existing_content)
+        action = self._determine_action(task, target_line, existing_content, file_path)
         
         # Step 3: Generate CONTENT (focused generation)
-        content = self._generate_modification_content(task, file_path, action)
+        content = self._generate_modification_content(task, file_path, action, existing_content)
         
         # Step 4: Apply the modification
         return self._apply_simple_modification(existing_content, target_line, action, content)
     
+    def _patch_file(self, task: str, file_path: str, existing_content: str, max_tries: int = 2) -> str:
+        """
+        Asks for the change as a unified diff or SEARCH/REPLACE blocks and applies it with
+        patch_tools. A rejected patch is sent back with the rejections for another try.
+        
+        Args:
+            task: The task description
+            file_path: Path of the file to modify
+            existing_content: Current content of the file
+            max_tries: Number of patches asked for
+            
+        Returns:
+            str: Patched file content, or None if no patch could be applied
+        """
+        messages = [
+            self._file_context(file_path, existing_content, task),
+            {'role': 'user', 'content': self.patch_prompt.format(task=task, file_path=file_path)}
+        ]
+        for _ in range(max_tries):
+            response = self._chat("patch_file", messages=messages, options={"temperature": 0})
+            answer = response['message']['content']
+
+            hunks = parse_patch(answer)
+            if not hunks:
+                rejections = [{"hunk": 0, "line": None, "reason": "no patch found", "context": ""}]
+            else:
+                # the agent edits one file at a time, every hunk is for this file
+                new_content, rejections = apply_patch(existing_content, hunks)
+                if not rejections:
+                    return new_content
+            report = format_rejections(rejections)
+            logging.info(f"Patch for {file_path} rejected:\n{report}")
+            messages = messages + [
+                {'role': 'assistant', 'content': answer},
+                {'role': 'user', 'content': f"The patch could not be applied:\n{report}\n"
+                                            f"Answer with a corrected patch for the whole change."}
+            ]
+        return None
+    
+    def _plan_edits(self, task: str, file_path: str, existing_content: str) -> List[Dict]:
+        """
+        Asks for every change to the file at once as a list of hunks (see edit_plan).
+        
+        Args:
+            task: The task description
+            file_path: Path of the file to modify
+            existing_content: Current content of the file
+            
+        Returns:
+            List[Dict]: Validated hunks sorted by line, or None if the plan is not valid
+        """
+        total_lines = len(existing_content.split('\n'))
+        plan_prompt = self.edit_plan_prompt.format(task=task, file_path=file_path, total_lines=total_lines)
+
+        # Backends with structured outputs are held to the hunk schema
+        kwargs = {"format": EDIT_PLAN_SCHEMA} if self.client.supports_format else {}
+        response = self._chat(
+            "plan_edits",
+            messages=[self._file_context(file_path, existing_content, task), {'role': 'user', 'content': plan_prompt}],
+            options={"temperature": 0},
+            **kwargs
+        )
+
+        hunks = parse_edit_plan(response['message']['content'])
+        return validate_edit_plan(hunks, total_lines)
+    
+    def _file_context(self, file_path: str, existing_content: str, task: str = "") -> Dict[str, str]:
+        """
+        Shared first message of the modify steps: the file with line numbers.
+        Files longer than max_file_lines are cut down to the regions relevant to the task,
+        the shown lines keep their original numbers so every step answers in file lines.
+        
+        Args:
+            file_path: Path of the file to modify
+            existing_content: Current content of the file
+            task: The task description the relevant regions are picked for
+            
+        Returns:
+            Dict: chat message with the numbered file
+        """
+        lines = existing_content.split('\n')
+        windows = relevant_windows(lines, task, max_lines=self.max_file_lines)
+        numbered_content = render_windows(lines, windows)
+        if windows != [(0, len(lines))]:
+            shown = sum(end - start for start, end in windows)
+            logging.info(f"Showing {shown} of {len(lines)} lines of {file_path}")
+            return {'role': 'user', 'content': f"File: {file_path}\n\nRelevant parts of the file with line numbers "
+                                               f"({len(lines)} lines in total):\n{numbered_content}"}
+        return {'role': 'user', 'content': f"File: {file_path}\n\nCurrent file with line numbers:\n{numbered_content}"}
+    
     def _identify_target_line(self, task: str, file_path: str, existing_content: str) -> int:
         """
         Step 1: Just identify which line number to target.
@@ -303,20 +476,18 @@ class CodingAgent(Node):
         lines = existing_content.split('\n')
         total_lines = len(lines)
         
-        # Show numbered content for line identification
-        numbered_content = '\n'.join(f"{i+1:3}: {line}" for i, line in enumerate(lines))
-        
+        # The numbered content is in the shared file message in front of the prompt
         line_prompt = self.line_identification_prompt.format(
             task=task, 
             file_path=file_path, 
-            numbered_content=numbered_content,
+            numbered_content="(shown above)",
             total_lines=total_lines,
             middle_line=total_lines // 2
         )
 
-        response = ollama.chat(
-            model=self.model_name,
-            messages=[{'role': 'user', 'content': line_prompt}]
+        response = self._chat(
+            "identify_target_line",
+            messages=[self._file_context(file_path, existing_content, task), {'role': 'user', 'content': line_prompt}]
         )
         
         # Extract line number with fallback
@@ -343,7 +514,7 @@ class CodingAgent(Node):
         else:
             return max(1, total_lines // 2)  # Default to middle
     
-    def _determine_action(self, task: str, target_line: int, existing_content: str) -> str:
+    def _determine_action(self, task: str, target_line: int, existing_content: str, file_path: str = "") -> str:
         """
         Step 2: Determine what type of action to take (simplified choices).
         
@@ -351,25 +522,28 @@ class CodingAgent(Node):
             task: The task description
             target_line: The target line number
             existing_content: Current content of the file
+            file_path: Path of the file to modify
             
         Returns:
             str: Action type ('add_after', 'add_before', 'replace')
         """
         action_prompt = self.action_selection_prompt.format(task=task, target_line=target_line)
 
-        response = ollama.chat(
-            model=self.model_name,
-            messages=[{'role': 'user', 'content': action_prompt}]
+        # The answer is constrained to a single letter
+        response = self._chat(
+            "determine_action",
+            messages=[self._file_context(file_path, existing_content, task), {'role': 'user', 'content': action_prompt}],
+            **self._constrained(["A", "B", "C"])
         )
         
         # Parse response with fallback
-        choice = response['message']['content'].strip().upper()
+        choice = self._parse_choice(response['message']['content'], ["A", "B", "C"])
         
-        if 'A' in choice or 'AFTER' in choice.upper():
+        if choice == 'A':
             return 'add_after'
-        elif 'B' in choice or 'BEFORE' in choice.upper():
+        elif choice == 'B':
             return 'add_before'
-        elif 'C' in choice or 'REPLACE' in choice.upper():
+        elif choice == 'C':
             return 'replace'
         else:
             # Fallback based on task keywords
@@ -381,7 +555,7 @@ class CodingAgent(Node):
             else:
                 return 'add_after'  # Safe default
     
-    def _generate_modification_content(self, task: str, file_path: str, action: str) -> str:
+    def _generate_modification_content(self, task: str, file_path: str, action: str, existing_content: str = "") -> str:
         """
         Step 3: Generate the specific content to add/replace.
         
@@ -389,6 +563,7 @@ class CodingAgent(Node):
             task: The task description
             file_path: Path of the file to modify
             action: The action type
+            existing_content: Current content of the file
             
         Returns:
             str: Generated content
@@ -398,9 +573,9 @@ class CodingAgent(Node):
         else:  # add_after or add_before
             content_prompt = self.add_content_prompt.format(task=task, file_path=file_path)
 
-        response = ollama.chat(
-            model=self.model_name,
-            messages=[{'role': 'user', 'content': content_prompt}]
+        response = self._chat(
+            "generate_modification_content",
+            messages=[self._file_context(file_path, existing_content, task), {'role': 'user', 'content': content_prompt}]
         )
         
         content = response['message']['content'].strip()
@@ -550,82 +725,129 @@ class CodingAgent(Node):
             bool: True if modification was successful
         """
         try:
-            # Write new content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-                
+            # Write new content, readers never see a half written file
+            write_atomic(file_path, new_content)
+            
             return True
         except Exception as e:
             logging.error(f"Error modifying file {file_path}: {str(e)}")
             return False
 
-    def execute_task(self, file_tree: str, task: str, base_path: str = "") -> Dict[str, List[str]]:
+    def execute_task(self, file_tree: str, task: str, base_path: str = "", max_workers: int = 4) -> Dict[str, List[str]]:
         """
         Executes a task by analyzing, reading, and modifying files as needed.
+        The files are worked on concurrently by up to max_workers threads, so a multi-file task
+        takes about as long as its slowest file. Edits that resolve to the same file are
+        serialized in the order the analysis listed them.
         
         Args:
             file_tree: ASCII representation of the file tree
             task: Description of the task to be performed
             base_path: Base path for file operations
+            max_workers: Number of files worked on at once
             
         Returns:
-            Dict containing results of the operation
+            Dict containing results of the operation, with a unified diff per changed file under "diffs"
         """
         # Analyze which files need to be modified or created
-        analysis = self.analyze_task(file_tree, task)
-        
-        # Handle file modifications
-        if analysis["modify"]:
-            # Read existing files with full paths
-            full_paths = []
-            for file_path in analysis["modify"]:
-                full_path = self.resolve_path(base_path, file_path)
-                full_paths.append(full_path)
-            
-            file_contents = fetch_files_from_codebase(full_paths)
-            logging.info(f"Read {len(file_contents)} files for modification")
-            
-            # Generate and apply modifications
-            for i, file_path in enumerate(analysis["modify"]):
-                try:
-                    # Resolve the full path
-                    full_path = full_paths[i]
-                    
-                    # Get existing content using full path
-                    existing_content = file_contents.get(full_path, "")
-                    
-                    # Generate new content
-                    new_content = self.generate_file_content(task, file_path, existing_content)
-                    
-                    # Safely modify the file
-                    if self.safe_modify_file(full_path, new_content):
-                        logging.info(f"Successfully modified {file_path}")
-                    else:
-                        logging.error(f"Failed to modify {file_path}")
-                except Exception as e:
-                    logging.error(f"Error processing {file_path}: {str(e)}")
-        
-        # Handle file creation
-        if analysis["create"]:
-            for file_path in analysis["create"]:
+        index = self.path_index(file_tree, base_path)
+        analysis = self.analyze_task(file_tree, task, path_index=index)
+        analysis["diffs"] = {}
+
+        # Group the edits by resolved path, the edits of one group run one after another
+        edits = {}
+        for action in ("modify", "create"):
+            for file_path in analysis[action]:
                 try:
-                    # Resolve the full path
                     full_path = self.resolve_path(base_path, file_path)
-                    
-                    # Generate content for new file
-                    new_content = self.generate_file_content(task, file_path)
-                    
-                    # Create directory if needed
-                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                    
-                    # Write the file
-                    with open(full_path, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
-                    logging.info(f"Created new file {file_path}")
-                except Exception as e:
-                    logging.error(f"Error creating {file_path}: {str(e)}")
+                except ValueError as e:
+                    logging.error(f"Error processing {file_path}: {str(e)}")
+                    continue
+                edits.setdefault(full_path, []).append((action, file_path))
+
+        # Read existing files with full paths
+        modify_paths = [full_path for full_path, group in edits.items()
+                        if any(action == "modify" for action, _ in group)]
+        file_contents = fetch_files_from_codebase(modify_paths) if modify_paths else {}
+        if modify_paths:
+            logging.info(f"Read {len(file_contents)} files for modification")
+
+        diffs_lock = threading.Lock()
+        labels = current_span_labels()  # e.g. the task_id, spans of the workers carry it too
+        # with several files generated at once the streamed output of each file is passed on
+        # whole when the file is done, otherwise the pieces of different files interleave
+        buffer_tokens = max_workers > 1 and len(edits) > 1
+
+        def run_edits(full_path, group):
+            with span_labels(**labels):
+                self._token_buffers.pieces = [] if buffer_tokens else None
+                existing_content = file_contents.get(full_path, "")
+                for action, file_path in group:
+                    if action == "modify":
+                        new_content = self._modify_file(task, file_path, full_path, existing_content)
+                    else:
+                        new_content = self._create_file(task, file_path, full_path)
+                        if new_content is not None:
+                            index.add(file_path)
+                    self._flush_tokens()
+                    if new_content is None:
+                        continue
+                    with diffs_lock:
+                        analysis["diffs"][file_path] = self._diff(file_path, existing_content if action == "modify" else "",
+                                                                  new_content)
+                    # a later edit of the same file builds on this one
+                    existing_content = new_content
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            for future in [pool.submit(run_edits, full_path, group) for full_path, group in edits.items()]:
+                future.result()
         
         return analysis
+
+    def _modify_file(self, task: str, file_path: str, full_path: str, existing_content: str):
+        """
+        Generates and writes the new content of an existing file, returns it or None if that failed.
+        """
+        try:
+            # Generate new content
+            new_content = self.generate_file_content(task, file_path, existing_content)
+            
+            # Safely modify the file
+            if self.safe_modify_file(full_path, new_content):
+                logging.info(f"Successfully modified {file_path}")
+                return new_content
+            logging.error(f"Failed to modify {file_path}")
+        except Exception as e:
+            logging.error(f"Error processing {file_path}: {str(e)}")
+        return None
+
+    def _create_file(self, task: str, file_path: str, full_path: str):
+        """
+        Generates and writes a new file, returns its content or None if that failed.
+        """
+        try:
+            # Generate content for new file
+            new_content = self.generate_file_content(task, file_path)
+            
+            # Create directory if needed
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            
+            # Write the file
+            with open(full_path, 'w', encoding='utf-8') as f:
+                f.write(new_content)
+            logging.info(f"Created new file {file_path}")
+            return new_content
+        except Exception as e:
+            logging.error(f"Error creating {file_path}: {str(e)}")
+        return None
+
+    def _diff(self, file_path: str, old_content: str, new_content: str) -> str:
+        """
+        Unified diff of one file, in the a/ b/ form git uses.
+        """
+        return ''.join(difflib.unified_diff(old_content.splitlines(keepends=True),
+                                            new_content.splitlines(keepends=True),
+                                            fromfile=f"a/{file_path}", tofile=f"b/{file_path}"))
     
     def generate_command(self, script_path: str):
         """
@@ -658,7 +880,7 @@ class CodingAgent(Node):
             f"Based on the file extension and context, determine the appropriate shell command to run the script: {script_path}. "
             f"Say ONLY the command. Your exact response will be used for the command. You will be punished for any additional words or explanations."
         )
-        response = self.instruct(instruction)
+        response = self.ask(instruction, stage="generate_command")
         return response.strip()
 
     def check_status(self, script_path: str, id: str) -> tuple:
@@ -744,7 +966,7 @@ class CodingAgent(Node):
             f"You are a precise and obedient assistant. Given the following script output, determine if the script ran successfully. "
             f"Respond ONLY with 'success' if successful, or 'fail' if not. You will be severely punished for saying more than 1 word. Output: {output}"
         )
-        response = self.instruct(instruction).strip().lower()
+        response = self.ask_choice(instruction, ["success", "fail"], stage="is_successful_output")
         status = "success" if response == "success" else "fail"
         return {"status": status, "output": output}
     
@@ -775,8 +997,8 @@ class CodingAgent(Node):
 
     def instruct(self, instruction, task1):
         # 1. Get response from model
-        response = ollama.chat(
-            model=self.model_name,
+        response = self._chat(
+            "instruct",
             messages=[
                 {'role': 'system', 'content': self.sys_msg},
                 {'role': 'user', 'content': instruction}
@@ -972,6 +1194,36 @@ if __name__ == "__main__":
                         You must put ONLY the raw file content between START_CODE and END_CODE. Do not include any explanations, descriptions, or markdown formatting.
                         """
 
+    edit_plan_prompt = """Task: {task}
+                        File: {file_path} ({total_lines} lines, numbered above)
+
+                        List every change the task needs as hunks of line numbers from the numbered file.
+                        Each hunk has start_line and end_line (inclusive), an action and the new content:
+                        - replace: replace lines start_line to end_line with content
+                        - delete: remove lines start_line to end_line, content is ""
+                        - add_before: insert content before start_line
+                        - add_after: insert content after end_line
+                        Hunks must not overlap. Content is the raw code with its indentation, NO explanations, NO markdown.
+
+                        Output ONLY this JSON:
+                        {{"hunks": [{{"start_line": 3, "end_line": 3, "action": "add_after", "content": "// new line"}}]}}
+                        """
+
+    patch_prompt = """Task: {task}
+                        File: {file_path} (shown above)
+
+                        Write ONLY the changed regions of the file as SEARCH/REPLACE blocks:
+
+<<<<<<< SEARCH
+[the exact lines of the file to change, a few lines around them so they are unique]
+=======
+[the new lines]
+>>>>>>> REPLACE
+
+                        Use one block per changed region. Copy the SEARCH lines exactly from the file, WITHOUT the line numbers.
+                        Do not repeat the rest of the file. NO explanations, NO markdown.
+                        """
+
 
     # Example usage
     model_name = "qwen2.5:7b"
@@ -986,7 +1238,9 @@ if __name__ == "__main__":
         action_selection_prompt,
         replace_content_prompt, 
         add_content_prompt, 
-        new_file_prompt
+        new_file_prompt,
+        edit_plan_prompt,
+        patch_prompt
     )
 
     
@@ -0,0 +1,107 @@
+import re
+
+"""
+    Relevance windows for large files.
+    Instead of the whole file the model is shown the regions the task is about: the file is
+    cut into top-level symbol chunks (functions, classes, components, ...), the chunks are
+    scored by the words they share with the task and the best ones are kept within a line
+    budget. The kept lines keep their original numbers, so answers need no mapping back.
+"""
+
+# start of a top-level definition in Python, JS/TS and similar languages
+_DEFINITION = re.compile(r'^(export\s+)?(default\s+)?(async\s+)?'
+                         r'(def|class|function|const|let|var|interface|type|enum|struct|fn|func)\b')
+_WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_STOP_WORDS = {"the", "and", "for", "with", "that", "this", "from", "into", "add", "make", "file", "line",
+               "code", "should", "when", "new", "use", "are", "not", "all", "any", "can"}
+
+def task_terms(task):
+    """
+    Lowercased words of the task worth searching for with their weight, camelCase and
+    snake_case names are split into parts too, which weigh less than the whole name.
+    """
+    terms = {}
+    for word in _WORD.findall(task):
+        parts = re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+', word) + word.split('_')
+        for part in parts:
+            if len(part) >= 3:
+                terms.setdefault(part.lower(), 1)
+        if len(word) >= 3:
+            terms[word.lower()] = 3
+    return {term: weight for term, weight in terms.items() if term not in _STOP_WORDS}
+
+def symbol_chunks(lines):
+    """
+    (start, end) line index ranges of the top-level chunks, the first one holds e.g. the imports.
+    """
+    starts = [0] + [i for i, line in enumerate(lines) if i > 0 and _DEFINITION.match(line)]
+    return list(zip(starts, starts[1:] + [len(lines)]))
+
+def _score(lines, terms):
+    return sum(terms.get(word.lower(), 0) for line in lines for word in _WORD.findall(line))
+
+def relevant_windows(lines, task, max_lines=300, context=8):
+    """
+    Returns sorted, non-overlapping (start, end) line index ranges of the file to show for the task,
+    the whole file if it fits max_lines or nothing in it matches the task.
+    """
+    if len(lines) <= max_lines:
+        return [(0, len(lines))]
+    terms = task_terms(task)
+
+    windows = []
+    for start, end in symbol_chunks(lines):
+        score = _score(lines[start:end], terms)
+        if not score:
+            continue
+        if end - start > max_lines // 2:
+            # too big to show whole, only the matching lines with some context
+            for i in range(start, end):
+                if _score([lines[i]], terms):
+                    windows.append((score, max(start, i - context), min(end, i + context + 1)))
+        else:
+            windows.append((score, start, end))
+    if not windows:
+        return [(0, len(lines))]
+    # chunks that only share a common word with the task are left out
+    best = max(score for score, _, _ in windows)
+    windows = [window for window in windows if window[0] * 2 >= best]
+
+    # the beginning and the end of the file are kept when the task asks for them
+    if re.search(r'\b(beginning|start|top)\b', task, re.IGNORECASE):
+        windows.append((float('inf'), 0, min(len(lines), context * 2)))
+    if re.search(r'\b(end|bottom)\b', task, re.IGNORECASE):
+        windows.append((float('inf'), max(0, len(lines) - context * 2), len(lines)))
+
+    kept, shown = [], set()
+    for score, start, end in sorted(windows, key=lambda window: (-window[0], window[1])):
+        new = set(range(start, end)) - shown
+        if len(shown) + len(new) > max_lines:
+            continue
+        shown |= new
+        kept.append((start, end))
+    return _merge(kept)
+
+def _merge(windows):
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def render_windows(lines, windows):
+    """
+    The lines of the windows with their original 1-based numbers, skipped regions as "...".
+    """
+    rendered = []
+    previous_end = 0
+    for start, end in windows:
+        if start > previous_end:
+            rendered.append(f"... (lines {previous_end + 1}-{start} not shown)")
+        rendered.extend(f"{i + 1:3}: {lines[i]}" for i in range(start, end))
+        previous_end = end
+    if previous_end < len(lines):
+        rendered.append(f"... (lines {previous_end + 1}-{len(lines)} not shown)")
+    return '\n'.join(rendered)
@@ -0,0 +1,106 @@
+import re
+import json
+
+"""
+    Structured edit plans for existing files.
+    The model answers once with every change to the file as a list of hunks,
+    {"start_line", "end_line", "action", "content"} with 1-based inclusive line numbers:
+        replace     replaces lines start_line..end_line with content
+        delete      removes lines start_line..end_line
+        add_before  inserts content before start_line
+        add_after   inserts content after end_line
+    The hunks are checked against the file and applied bottom-up, so the line numbers of
+    one hunk never shift because of another.
+"""
+
+ACTIONS = ("replace", "delete", "add_before", "add_after")
+
+EDIT_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "hunks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "start_line": {"type": "integer"},
+                    "end_line": {"type": "integer"},
+                    "action": {"type": "string", "enum": list(ACTIONS)},
+                    "content": {"type": "string"},
+                },
+                "required": ["start_line", "end_line", "action", "content"],
+            },
+        },
+    },
+    "required": ["hunks"],
+}
+
+def parse_edit_plan(response):
+    """
+    Returns the list of hunks in a model response, None if there is none.
+    Accepts {"hunks": [...]} or a bare list, also inside surrounding text or a code block.
+    """
+    plan = None
+    try:
+        plan = json.loads(response)
+    except json.JSONDecodeError:
+        match = re.search(r'(\{.*\}|\[.*\])', response, re.DOTALL)
+        if match:
+            try:
+                plan = json.loads(match.group(1))
+            except json.JSONDecodeError:
+                return None
+    if isinstance(plan, dict):
+        plan = plan.get("hunks")
+    return plan if isinstance(plan, list) else None
+
+def validate_edit_plan(hunks, total_lines):
+    """
+    Checks the hunks against a file of total_lines lines and returns them sorted by line,
+    or None if any hunk is malformed, out of range or overlaps another one.
+    An empty file (total_lines 0) only takes insertions at line 0 or 1.
+    """
+    if not hunks:
+        return None
+    checked = []
+    for hunk in hunks:
+        if not isinstance(hunk, dict) or hunk.get("action") not in ACTIONS:
+            return None
+        try:
+            start, end = int(hunk["start_line"]), int(hunk.get("end_line", hunk["start_line"]))
+        except (KeyError, TypeError, ValueError):
+            return None
+        content = hunk.get("content") or ""
+        if not isinstance(content, str):
+            return None
+        if hunk["action"] in ("add_before", "add_after") and total_lines == 0:
+            start = end = 0
+        elif not 1 <= start <= end <= total_lines:
+            return None
+        if hunk["action"] in ("replace", "add_before", "add_after") and not content:
+            return None
+        checked.append({"start_line": start, "end_line": end, "action": hunk["action"], "content": content})
+
+    checked.sort(key=lambda hunk: (hunk["start_line"], hunk["end_line"]))
+    for previous, hunk in zip(checked, checked[1:]):
+        if hunk["start_line"] <= previous["end_line"]:
+            return None
+    return checked
+
+def apply_edit_plan(content, hunks):
+    """
+    Applies validated hunks to the file content in one pass, last hunk first.
+    """
+    lines = content.split('\n') if content else []
+    for hunk in sorted(hunks, key=lambda hunk: hunk["start_line"], reverse=True):
+        start, end = hunk["start_line"], hunk["end_line"]
+        new_lines = hunk["content"].rstrip('\n').split('\n') if hunk["content"] else []
+        if hunk["action"] == "replace":
+            lines[start - 1:end] = new_lines
+        elif hunk["action"] == "delete":
+            del lines[start - 1:end]
+        elif hunk["action"] == "add_before":
+            lines[max(start - 1, 0):max(start - 1, 0)] = new_lines
+        else:
+            lines[end:end] = new_lines
+    return '\n'.join(lines)
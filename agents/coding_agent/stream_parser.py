@@ -0,0 +1,49 @@
+class CodeStreamParser:
+    """
+    Incremental parser for responses that put the file between START_CODE and END_CODE.
+    Feed it the streamed pieces as they arrive, feed returns True once END_CODE was seen
+    so the caller can stop generating. Markers split across pieces are still found and
+    each piece is only searched once.
+    """
+    def __init__(self, start_marker="START_CODE", end_marker="END_CODE"):
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self.text = ""
+        self.start = -1  # index right after the start marker
+        self.end = -1  # index of the end marker
+        self._searched = 0  # text before this index was searched for the current marker
+
+    @property
+    def done(self):
+        return self.end != -1
+
+    def feed(self, piece):
+        """
+        Adds a streamed piece of the response, returns True once the code is complete.
+        """
+        if self.done:
+            return True
+        self.text += piece
+        if self.start == -1:
+            index = self.text.find(self.start_marker, self._searched)
+            if index == -1:
+                self._searched = max(0, len(self.text) - len(self.start_marker) + 1)
+                return False
+            self.start = index + len(self.start_marker)
+            self._searched = self.start
+        index = self.text.find(self.end_marker, self._searched)
+        if index == -1:
+            self._searched = max(self.start, len(self.text) - len(self.end_marker) + 1)
+            return False
+        self.end = index
+        return True
+
+    @property
+    def code(self):
+        """
+        The code between the markers so far, None until the start marker was seen.
+        A response cut off before END_CODE gives everything after START_CODE.
+        """
+        if self.start == -1:
+            return None
+        return self.text[self.start:self.end if self.done else len(self.text)].strip()
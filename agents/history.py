@@ -0,0 +1,121 @@
+"""
+    Token-bounded conversation history for Node based agents.
+    Keeps a running token estimate of the messages so trimming never re-counts the
+    whole conversation, and applies one of the STRATEGIES once the budget is exceeded.
+"""
+
+# sliding_window   drops the oldest messages, the system prompt included
+# pinned_system    keeps the system prompt and drops the oldest turns after it
+# summarize_oldest replaces the oldest half of the turns with a summary, falls back to pinned_system
+STRATEGIES = ("sliding_window", "pinned_system", "summarize_oldest")
+
+# rough cost of an image attached to a message
+IMAGE_TOKENS = 768
+
+def estimate_tokens(message):
+    """
+    Cheap token estimate of a chat message, about four characters per token plus the role overhead.
+    """
+    return len(message.get("content") or "") // 4 + 4 + IMAGE_TOKENS * len(message.get("images") or [])
+
+
+class ConversationHistory:
+    def __init__(self, sys_msg, max_tokens=4096, strategy="pinned_system", summarizer=None):
+        assert strategy in STRATEGIES, f"Unsupported history strategy: {strategy}"
+        self.sys_msg = sys_msg
+        self.max_tokens = max_tokens
+        self.strategy = strategy
+        self.summarizer = summarizer  # callable(messages) -> summary text, used by summarize_oldest
+        self.clear()
+
+    def clear(self):
+        """
+        Drops everything but the system prompt.
+        """
+        self.turns = [{"role": "system", "content": self.sys_msg}]
+        self.token_counts = [estimate_tokens(self.turns[0])]
+        self.tokens = self.token_counts[0]
+
+    def __len__(self):
+        return len(self.turns)
+
+    def messages(self, *extra):
+        """
+        Returns the messages to send, followed by any extra messages that are not stored.
+        """
+        return self.turns + list(extra)
+
+    def append(self, *messages, trim=True):
+        """
+        Adds messages to the history and trims it back under the token budget.
+        With trim=False the caller trims later, e.g. after summarizing outside a lock.
+        """
+        for message in messages:
+            count = estimate_tokens(message)
+            self.turns.append(message)
+            self.token_counts.append(count)
+            self.tokens += count
+        if trim:
+            self.trim()
+
+    def _pop(self, index):
+        self.tokens -= self.token_counts.pop(index)
+        return self.turns.pop(index)
+
+    def _pinned(self):
+        # number of leading messages that are never trimmed
+        return 0 if self.strategy == "sliding_window" else 1
+
+    def trim(self, summarize=True):
+        """
+        Applies the strategy until the history fits the budget, the latest message is always kept.
+        With summarize=False the oldest turns are dropped without summarizing them.
+        """
+        if self.tokens <= self.max_tokens:
+            return
+        if summarize:
+            self._summarize_oldest()
+
+        first = self._pinned()
+        while self.tokens > self.max_tokens and len(self.turns) - first > 1:
+            self._pop(first)
+
+    def oldest_turns(self):
+        """
+        The oldest half of the turns if the history is over budget and they should be summarized, else [].
+        """
+        if self.tokens <= self.max_tokens or self.strategy != "summarize_oldest" or self.summarizer is None:
+            return []
+        first = self._pinned()
+        count = (len(self.turns) - first) // 2
+        return self.turns[first:first + count] if count >= 2 else []
+
+    def replace_oldest(self, oldest, summary):
+        """
+        Replaces the turns returned by oldest_turns with their summary, unless they are no
+        longer the oldest turns, e.g. because another caller summarized them meanwhile.
+        Returns True if they were replaced.
+        """
+        first = self._pinned()
+        current = self.turns[first:first + len(oldest)]
+        if not oldest or len(current) != len(oldest) or any(a is not b for a, b in zip(current, oldest)):
+            return False
+        for _ in oldest:
+            self._pop(first)
+        message = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+        self.turns.insert(first, message)
+        self.token_counts.insert(first, estimate_tokens(message))
+        self.tokens += self.token_counts[first]
+        return True
+
+    def _summarize_oldest(self):
+        # the turns are only replaced once the summary exists, trim drops them if it fails
+        oldest = self.oldest_turns()
+        if not oldest:
+            return
+        try:
+            summary = self.summarizer(oldest)
+        except Exception as e:
+            print(f"Unable to summarize the history, dropping the oldest turns: {e}")
+            return
+        self.replace_oldest(oldest, summary)
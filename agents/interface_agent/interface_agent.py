@@ -1,6 +1,5 @@
 # Run with python -m agents.interface_agent.interface_agent
 
-import ollama
 import re
 from agents.node import Node
 from agents.interface_agent.util import unzip_file
@@ -8,31 +7,25 @@ from agents.interface_agent.util import convert_to_base64
 from shared.file_tools import extract_json
 
 class InterfaceAgent(Node):
-    def __init__(self, model_name, backend, sys_msg, temperature):
+    def __init__(self, model_name, backend, sys_msg, temperature, max_history_tokens=4096,
+                 history_strategy="summarize_oldest"):
         self.temperature = temperature
-        # Add system prompt to message history
-        self.messages = [
-            {
-                            'role': 'system',
-                            'content': sys_msg
-            }
-        ]
-        super().__init__(model_name, backend, sys_msg)
+        # the message history starts with the system prompt, old turns are summarized
+        # so requirements from early in the conversation are not lost
+        super().__init__(model_name, backend, sys_msg, max_history_tokens=max_history_tokens,
+                         history_strategy=history_strategy)
 
     def clear (self):
         """
         Clears the agent's message history.
         """
-        self.messages = [
-            {
-                            'role': 'system',
-                            'content': sys_msg
-            }
-        ]
-
-    def instruct(self, instruction):
+        with self._history_lock:
+            self.history.clear()
+
+    def instruct(self, instruction, on_token=None):
         """
         Instructs the agent to perform a task.
+        With on_token the response is streamed and every piece is passed to it as it arrives.
         """
 
         def get_image_path(text: str) -> list[str]:
@@ -56,18 +49,23 @@ class InterfaceAgent(Node):
                             'content': instruction,
                             'images': image_data
                     }
-        self.messages.append(user_msg)
-
-        if self.backend == "ollama":
-            response = ollama.chat(model=self.model_name,
-                    messages=self.messages,
-                    tools = self.tools,
-                    options = {'temperature': self.temperature} #EDITED
-            )
 
-            response = response['message']['content']
-            # Add agent message to history
-            self.messages.append(
+        if self.backend != "huggingface":
+            messages = self._history_messages(user_msg)
+            options = {'temperature': self.temperature} #EDITED
+            if on_token is not None:
+                # pass the reply on while it is generated
+                response = ""
+                for chunk in self._stream("instruct", messages=messages, tools=self.tools, options=options):
+                    on_token(chunk['message']['content'])
+                    response += chunk['message']['content']
+            else:
+                response = self._chat("instruct", messages=messages, tools=self.tools, options=options)
+                response = response['message']['content']
+
+            # Add user and agent message to history
+            self._remember(
+                user_msg,
                 {
                     'role': 'assistant',
                     'content': response
@@ -1,52 +1,238 @@
-import ollama
+import re
+import json
+import threading
+from shared.timing_tools import span, record_tokens
+from agents.history import ConversationHistory
+from agents.backends import get_backend
 from shared.ollama_tools.ollama_tools import generate_function_description
 from shared.github_tools import create_github_issue, get_issue_count
 from smolagents import HfApiModel, CodeAgent
 
 """
     This module defines a Node class that represents our base for an Agent
-    Handles the model backend between huggingface and ollama
+    Every model call goes through a backend from agents/backends.py (ollama, huggingface or fake),
+    backend is either one of their names or a Backend instance
 """
+
+JSON_OVERHEAD_TOKENS = 16  # tokens of {"answer": ...} and the whitespace models put around it
+
 class Node():
-    def __init__(self, model_name, backend, sys_msg="You are a helpful assistant", max_new_tokens=1000):
+    def __init__(self, model_name, backend, sys_msg="You are a helpful assistant", max_new_tokens=1000,
+                 max_history_tokens=4096, history_strategy="pinned_system", stateless=False, keep_alive="30m"):
         self.model_name = model_name
         self.backend = backend
         self.sys_msg = sys_msg
-        self.history = [{"role": "system", "content": self.sys_msg}]
-        assert self.backend in ["huggingface", "ollama"], f"Unsupported backend: {self.backend}"
+        self.stateless = stateless  # instruct behaves like ask, for agents that need no conversational memory
+        self.keep_alive = keep_alive  # how long ollama keeps the model (and its prompt cache) loaded after a call
+        # bounded so the prompt, and with it prompt-eval time, stops growing over a long session
+        self.history = ConversationHistory(self.sys_msg, max_tokens=max_history_tokens, strategy=history_strategy,
+                                           summarizer=self._summarize)
+        self._history_lock = threading.Lock()
+        self.client = get_backend(backend, **({"max_new_tokens": max_new_tokens} if backend == "huggingface" else {}))
+        self.backend = self.client.name
 
         if self.backend == "ollama":
-            self.model = ollama.create(model='example', from_=self.model_name, system=sys_msg)
+            self.model = self.client.create(model='example', from_=self.model_name, system=sys_msg)
         elif self.backend == "huggingface":
-            # temp usage of api for huggingface
+            # temp usage of api for huggingface, tool calls run through a smolagents agent
             model = HfApiModel(model_id=self.model_name, max_new_tokens=max_new_tokens)
             self.model = CodeAgent(tools=[], model=model, add_base_tools=True)
+        else:
+            self.model = None
         self.tools = []
 
     def add_tool(self, tool):
         """
         Adds a tool to the node.
         """
-        if self.backend == "ollama":
-            self.tools.append(generate_function_description(tool))
-        elif self.backend == "huggingface":
+        if self.backend == "huggingface":
             self.tools.append(tool)
             self.model.tools[tool.name] = tool
+        else:
+            self.tools.append(generate_function_description(tool))
+
+    def _chat(self, stage, **kwargs):
+        """
+        Chat call on the node's model and backend, timed as a span of the given stage.
+        """
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        with span(type(self).__name__, stage, model=self.model_name) as record:
+            response = self.client.chat(self.model_name, **kwargs)
+            record_tokens(record, response)
+        return response
+
+    async def _achat(self, stage, **kwargs):
+        """
+        Async _chat, lets one thread keep several requests in flight.
+        """
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        with span(type(self).__name__, stage, model=self.model_name) as record:
+            response = await self.client.achat(self.model_name, **kwargs)
+            record_tokens(record, response)
+        return response
+
+    def _stream(self, stage, **kwargs):
+        """
+        Streaming _chat, yields the response pieces as they arrive.
+        The span covers the whole generation, also when the caller stops early.
+        """
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        with span(type(self).__name__, stage, model=self.model_name) as record:
+            for chunk in self.client.stream(self.model_name, **kwargs):
+                if chunk.get("done"):
+                    record_tokens(record, chunk)
+                yield chunk
+
+    def warm(self):
+        """
+        Loads the model ahead of the first call so that call does not pay the load time.
+        """
+        try:
+            with span(type(self).__name__, "warm", model=self.model_name):
+                self.client.warm(self.model_name, keep_alive=self.keep_alive)
+        except Exception as e:
+            print(f"Unable to warm {self.model_name}: {e}")
+
+    def _summarize(self, messages):
+        """
+        Condenses old history turns for the summarize_oldest strategy.
+        """
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        response = self._chat("summarize_history",
+                              messages=[{"role": "system", "content": "Summarize the conversation below in a few "
+                                                                      "sentences. Keep every requirement, decision "
+                                                                      "and name that was mentioned."},
+                                        {"role": "user", "content": transcript}])
+        return response['message']['content']
+
+    def _history_messages(self, *extra):
+        """
+        The history followed by the extra messages, read under the lock so concurrent callers can share a node.
+        """
+        with self._history_lock:
+            return self.history.messages(*extra)
+
+    def _remember(self, *messages):
+        """
+        Adds messages to the history. Summarizing old turns is a full model call, so it runs
+        outside the lock and the history stays usable meanwhile.
+        """
+        with self._history_lock:
+            self.history.append(*messages, trim=False)
+            oldest = self.history.oldest_turns()
+        summary = None
+        if oldest:
+            try:
+                summary = self._summarize(oldest)
+            except Exception as e:
+                print(f"Unable to summarize the history, dropping the oldest turns: {e}")
+        with self._history_lock:
+            if summary is not None:
+                self.history.replace_oldest(oldest, summary)
+            self.history.trim(summarize=False)
+
+    def _one_shot(self, instruction):
+        return [{"role": "system", "content": self.sys_msg}, {"role": "user", "content": instruction}]
+
+    def ask(self, instruction, stage="ask", **kwargs):
+        """
+        One-shot call that sends only the system prompt and the instruction.
+        The history is neither sent nor updated, so every call costs the same.
+        """
+        response = self._chat(stage, messages=self._one_shot(instruction), **kwargs)
+        return response['message']['content']
+
+    async def ask_async(self, instruction, stage="ask", **kwargs):
+        """
+        Async ask, e.g. asyncio.gather(*(node.ask_async(i) for i in instructions)).
+        """
+        response = await self._achat(stage, messages=self._one_shot(instruction), **kwargs)
+        return response['message']['content']
+
+    def ask_batch(self, instructions, stage="ask_batch", max_workers=4, **kwargs):
+        """
+        One-shot calls for several instructions at once, returns the answers in order.
+        """
+        kwargs.setdefault("keep_alive", self.keep_alive)
+        with span(type(self).__name__, stage, model=self.model_name, calls=len(instructions)) as record:
+            responses = self.client.batch(self.model_name, [self._one_shot(instruction) for instruction in instructions],
+                                          max_workers=max_workers, **kwargs)
+            record["prompt_tokens"] = sum(response.get("prompt_eval_count") or 0 for response in responses)
+            record["response_tokens"] = sum(response.get("eval_count") or 0 for response in responses)
+        return [response['message']['content'] for response in responses]
+
+    def _constrained(self, choices, max_tokens=16):
+        """
+        Chat kwargs that make the model answer with one of the choices and stop right after it.
+        Backends with structured outputs get a JSON schema {"answer": <choice>}, the others
+        stop at the first line break. Either way at most max_tokens are generated for the
+        answer, the JSON object around it gets JSON_OVERHEAD_TOKENS on top.
+        Read the answer with _parse_choice.
+        """
+        options = {"num_predict": max_tokens, "temperature": 0}
+        if self.client.supports_format:
+            options["num_predict"] += JSON_OVERHEAD_TOKENS
+            schema = {"type": "object", "properties": {"answer": {"type": "string", "enum": list(choices)}},
+                      "required": ["answer"]}
+            return {"format": schema, "options": options}
+        options["stop"] = ["\n"]
+        return {"options": options}
+
+    def _parse_choice(self, content, choices):
+        """
+        Returns the choice the model answered with, or None if the answer is not one of them.
+        Besides a bare choice or {"answer": <choice>} this accepts a JSON answer cut off by the
+        token cap if what is left of it starts only one choice, and text that names exactly one choice.
+        """
+        try:
+            answer = json.loads(content)
+            if isinstance(answer, dict):
+                answer = answer.get("answer")
+        except json.JSONDecodeError:
+            answer = content
+        if isinstance(answer, str):
+            normalized = answer.strip().strip('"\'.').lower()
+            for choice in choices:
+                if normalized == choice.lower():
+                    return choice
+        if not isinstance(content, str):
+            return None
+
+        truncated = re.search(r'"answer"\s*:\s*"([^"]*)', content)
+        if truncated and truncated.group(1).strip():
+            started = [choice for choice in choices if choice.lower().startswith(truncated.group(1).strip().lower())]
+            if len(started) == 1:
+                return started[0]
+        # single letters only count in their own case, "a" is usually not the choice "A"
+        named = [choice for choice in choices
+                 if re.search(rf'\b{re.escape(choice)}\b', content, re.IGNORECASE if len(choice) > 1 else 0)]
+        return named[0] if len(named) == 1 else None
+
+    def ask_choice(self, instruction, choices, stage="ask_choice", max_tokens=16):
+        """
+        Stateless one-word question, returns one of the choices or None.
+        """
+        content = self.ask(instruction, stage=stage, **self._constrained(choices, max_tokens))
+        return self._parse_choice(content, choices)
 
     def instruct(self, instruction):
         """
         Instructs the agent to perform a task.
         """
-        if self.backend == "ollama":
-            self.history += [{"role": "user", "content": instruction}]
-            response = ollama.chat(model=self.model_name,
-                                    messages=self.history,
-                                    tools=self.tools)
-            self.history += [{"role" : "assistant", "content" : response['message']['content']}]
+        if self.stateless:
+            return self.ask(instruction, stage="instruct", tools=self.tools)
+
+        if self.backend != "huggingface":
+            user_msg = {"role": "user", "content": instruction}
+            response = self._chat("instruct",
+                                  messages=self._history_messages(user_msg),
+                                  tools=self.tools)
+            self._remember(user_msg, {"role" : "assistant", "content" : response['message']['content']})
             response = response['message']['content']
 
-        elif self.backend == "huggingface":
-            response = self.model.run(instruction)
+        else:
+            with span(type(self).__name__, "instruct", model=self.model_name):
+                response = self.model.run(instruction)
 
         return response
 
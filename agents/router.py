@@ -0,0 +1,67 @@
+"""
+    Picks the model an agent should use instead of hard-coding model names.
+    Every category has a ladder of models from small and fast to large and slow. A call starts
+    on the rung its category, prompt size and the current load call for, and moves one rung
+    up each time its result fails validation.
+"""
+
+DEFAULT_ROUTES = {
+    "interface": ["gemma3:4b", "gemma3:12b"],
+    "orchestrator": ["cogito:3b", "cogito:8b"],
+    "regular": ["cogito:3b", "cogito:8b"],
+    "thinking": ["cogito:3b", "cogito:8b", "cogito:14b"],
+}
+
+def estimate_prompt_tokens(*texts):
+    """
+    Rough token count of the prompt text, about four characters per token.
+    """
+    return sum(len(text or "") for text in texts) // 4
+
+
+class ModelRouter:
+    def __init__(self, routes=None, large_prompt_tokens=2048, busy_backlog=4.0):
+        # the given routes replace the default ladders of their categories, so e.g. the
+        # "regular" fallback still exists when a device config only lists "thinking"
+        self.routes = {}
+        for category, models in {**DEFAULT_ROUTES, **(routes or {})}.items():
+            valid = isinstance(models, (list, tuple)) and all(isinstance(model, str) and model for model in models)
+            if not valid or not models:
+                raise ValueError(f"Route {category!r} needs a list of model names, got {models!r}")
+            self.routes[category] = list(models)
+        self.large_prompt_tokens = large_prompt_tokens  # prompts above this start one rung up
+        self.busy_backlog = busy_backlog  # queued tasks per device above which tasks start one rung down
+
+    def ladder(self, category):
+        return self.routes.get(category) or self.routes["regular"]
+
+    def route(self, category, prompt_tokens=0, load=None, attempt=0):
+        """
+        Returns the model for a call of the category.
+        prompt_tokens is the estimated prompt size, load the number of tasks waiting per device
+        and attempt how many times the call already failed validation.
+        """
+        ladder = self.ladder(category)
+        rung = 0
+        if prompt_tokens > self.large_prompt_tokens:
+            rung += 1
+        if load is not None and load >= self.busy_backlog:
+            # a long queue is drained faster by the small model
+            rung -= 1
+        rung = max(rung, 0) + attempt
+        return ladder[min(rung, len(ladder) - 1)]
+
+    def run(self, category, call, validate, prompt_tokens=0, load=None):
+        """
+        Calls call(model) and escalates to the next larger model while validate(result) is False.
+        Returns (result, model) of the first valid result, or of the largest model tried.
+        """
+        ladder = self.ladder(category)
+        first = ladder.index(self.route(category, prompt_tokens, load))
+        for model in ladder[first:]:
+            result = call(model)
+            if validate(result):
+                break
+            if model != ladder[-1]:
+                print(f"Result of {model} failed validation, escalating to a larger model")
+        return result, model
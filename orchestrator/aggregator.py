@@ -0,0 +1,76 @@
+from shared.log_tools import log_interaction
+from shared.timing_tools import percentile
+
+
+class ResultAggregator:
+    """
+    Collects the results the coding devices stream back with DONE (see orchestrator/dispatcher.py).
+    A result is {"task_id", "analysis": {"modify", "create"}, "diffs", "timings", "usage", "status"}
+    and is written to the run log as soon as it arrives. Latency of a task is measured on
+    the main device's clock, from submitting it to receiving its DONE.
+    """
+    def __init__(self, log_path=""):
+        self.log_path = log_path
+        self.results = []  # every collected result with device_id, latency and status
+
+    def add(self, task, done):
+        """
+        Records the DONE body of a task, done also carries device_id, submitted and finished.
+        """
+        result = dict(done.get("result") or {})
+        result.setdefault("task_id", task.get("id"))
+        result["status"] = result.get("status") or done.get("status")
+        result["device_id"] = done.get("device_id")
+        result["submitted"] = done.get("submitted")
+        result["finished"] = done.get("finished")
+        if result["submitted"] is not None and result["finished"] is not None:
+            result["latency"] = result["finished"] - result["submitted"]
+        else:
+            result["latency"] = None
+        self.results.append(result)
+        print(f"Result for task {result['task_id']} from device {result['device_id']}: {result['status']}")
+
+        if self.log_path:
+            log_interaction(self.log_path,
+            {
+                "agent": "aggregator",
+                "result": result
+            })
+
+    def usage_per_device(self):
+        """
+        Sums the token usage the devices reported with their results.
+        """
+        usage = {}
+        for result in self.results:
+            if not result.get("usage"):
+                continue
+            entry = usage.setdefault(str(result["device_id"]), {"tasks": 0, "calls": 0, "prompt_tokens": 0,
+                                                                "response_tokens": 0, "eval_time": 0.0,
+                                                                "tokens_per_sec": None})
+            entry["tasks"] += 1
+            for key in ("calls", "prompt_tokens", "response_tokens", "eval_time"):
+                entry[key] += result["usage"].get(key) or 0
+        for entry in usage.values():
+            if entry["eval_time"] > 0:
+                entry["tokens_per_sec"] = entry["response_tokens"] / entry["eval_time"]
+        return usage
+
+    def summary(self):
+        """
+        Returns throughput (tasks/s from the first submit to the last result) and
+        p50/p95/p99 task latency over the collected results.
+        """
+        latencies = [result["latency"] for result in self.results if result["latency"] is not None]
+        submitted = [result["submitted"] for result in self.results if result["submitted"] is not None]
+        finished = [result["finished"] for result in self.results if result["finished"] is not None]
+        span = max(finished) - min(submitted) if submitted and finished else 0
+        return {
+            "results": len(self.results),
+            "usage_per_device": self.usage_per_device(),
+            "failed": sum(1 for result in self.results if result["status"] != "success"),
+            "throughput": len(self.results) / span if span > 0 else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+        }
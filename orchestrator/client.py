@@ -2,6 +2,7 @@ import zmq
 import json
 import threading
 import time
+from orchestrator.dispatcher import encode, decode
 
 def start_handshake_server(context, port):
     socket = context.socket(zmq.REP)
@@ -16,39 +17,127 @@ def start_handshake_server(context, port):
     finally:
         socket.close()
 
-def text_listener(context, publisher_ip, port, topic, inactivity_timeout=10):
-    socket = context.socket(zmq.SUB)
-    socket.connect(f"tcp://{publisher_ip}:{port}")
-    socket.setsockopt_string(zmq.SUBSCRIBE, topic)
-    print(f"[Receiver] Listening for text messages...")
+class HeartbeatSender(threading.Thread):
+    """
+    Background thread that tells the orchestrator every interval seconds that the device
+    is alive, together with whatever the status callable returns (model_type, queue_depth,
+    model, tokens_per_sec). It owns a separate socket because ZeroMQ sockets must not be
+    shared between threads.
+    """
+    def __init__(self, context, orchestrator_ip, port, device_id, status=None, interval=2.0):
+        super().__init__(daemon=True)
+        self.context = context
+        self.address = f"tcp://{orchestrator_ip}:{port}"
+        self.device_id = str(device_id)
+        self.status = status
+        self.interval = interval
+        self.stopped = threading.Event()
 
-    last_received = time.time()
-    contents = []
-
-    try:
-        while True:
-            if socket.poll(timeout=1000):  # Timeout is in milliseconds
-                try: 
-                    message = socket.recv_string(flags=zmq.NOBLOCK)
-                except zmq.error.ZMQError:
-                    break
-                topic, content = message.split(" ", 1)
-                print(f"[Receiver] Received text: {content} (Topic: {topic})")
-                last_received = time.time()
-                contents.append(content)
-            else:
-                if time.time() - last_received > inactivity_timeout:
-                    print(f"No messages received for {inactivity_timeout} seconds. Shutting down receiver...")
-                    break
-    except KeyboardInterrupt:
-        print("Shutting down receiver (keyboard interrupt)...")
-    finally:
+    def run(self):
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.ROUTING_ID, f"{self.device_id}/heartbeat".encode("utf-8"))
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.address)
         try:
+            while True:
+                body = {"device_id": self.device_id}
+                if self.status is not None:
+                    body.update(self.status())
+                socket.send_multipart(encode("HEARTBEAT", body))
+                if self.stopped.wait(self.interval):
+                    break
+        finally:
             socket.close()
-        except Exception:
-            pass
-    
-    return contents
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class TaskReceiver:
+    """
+    Device side of the task protocol in orchestrator/dispatcher.py.
+    Connects a DEALER to the orchestrator and pulls tasks one at a time: recv_task asks
+    for work when the device is idle and task_done reports the finished task.
+    Every task is acknowledged and repeated message ids are dropped, so a retransmitted
+    task is only worked on once. Unless heartbeat_interval is None a HeartbeatSender reports
+    the device's queue depth plus anything the status callable returns (e.g. model, tokens_per_sec).
+    """
+    def __init__(self, context, orchestrator_ip, port, device_id, model_type=None, heartbeat_interval=2.0, status=None):
+        self.device_id = str(device_id)
+        self.socket = context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.ROUTING_ID, self.device_id.encode("utf-8"))
+        self.socket.setsockopt(zmq.LINGER, 1000)
+        self.socket.connect(f"tcp://{orchestrator_ip}:{port}")
+        self.seen = set()
+        self.current_msg_id = None
+        self.current_model_type = None  # queue the current task came from
+        self.current_backlog = None  # queued tasks per device when the current task was handed out
+        self.requested = False  # READY sent and no task received for it yet
+        self.model_type = model_type
+        self.status = status
+        self.send("HELLO", {"device_id": self.device_id, "model_type": model_type})
+
+        self.heartbeat = None
+        if heartbeat_interval is not None:
+            self.heartbeat = HeartbeatSender(context, orchestrator_ip, port, self.device_id,
+                                             status=self._heartbeat_status, interval=heartbeat_interval)
+            self.heartbeat.start()
+
+    def _heartbeat_status(self):
+        status = {"model_type": self.model_type, "queue_depth": 0 if self.current_msg_id is None else 1}
+        if self.status is not None:
+            status.update(self.status())
+        return status
+
+    def send(self, kind, body):
+        self.socket.send_multipart(encode(kind, body))
+
+    def recv_task(self, timeout=None):
+        """
+        Asks for work if the device has not already and returns the next new task,
+        or None if the orchestrator sent STOP or nothing new arrived within timeout seconds.
+        """
+        if not self.requested:
+            self.send("READY", {})
+            self.requested = True
+
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            if not self.socket.poll(None if remaining is None else int(remaining * 1000)):
+                return None
+
+            kind, body = decode(self.socket.recv_multipart())
+            if kind == "STOP":
+                return None
+            if kind != "TASK":
+                continue
+            # acknowledge duplicates too, the first ack may have been lost
+            self.send("ACK", {"msg_id": body["msg_id"]})
+            if body["msg_id"] in self.seen:
+                continue
+            self.seen.add(body["msg_id"])
+            self.current_msg_id = body["msg_id"]
+            self.current_model_type = body.get("model_type")
+            self.current_backlog = body.get("backlog")
+            self.requested = False
+            return body["task"]
+
+    def task_done(self, status="success", result=None):
+        """
+        Reports the task returned by the last recv_task as finished, result is streamed
+        back to the orchestrator's ResultAggregator.
+        """
+        if self.current_msg_id is None:
+            return
+        self.send("DONE", {"msg_id": self.current_msg_id, "status": status, "result": result})
+        self.current_msg_id = None
+
+    def close(self):
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
+        self.socket.close()
 
 if __name__ == "__main__":
     with open("orchestrator/ip.json") as f:
@@ -64,4 +153,11 @@ if __name__ == "__main__":
         daemon=True
     ).start()
 
-    text_listener(context, sender_ip, port="5555", topic="Topic")
+    task_receiver = TaskReceiver(context, sender_ip, config["devices"]["sender"]["port"],
+                                 device_id=receiver.get("id", receiver["ip"]))
+    try:
+        while (task := task_receiver.recv_task()) is not None:
+            print(f"[Receiver] Received task: {task}")
+            task_receiver.task_done()
+    finally:
+        task_receiver.close()
@@ -0,0 +1,320 @@
+import zmq
+import json
+import time
+import uuid
+import itertools
+from collections import deque
+from shared.timing_tools import span
+
+"""
+    Acknowledged, pull-based task delivery between the orchestrator and the coding devices.
+    The orchestrator binds a ROUTER socket and every device connects a DEALER whose
+    routing id is its device id. Messages are two frames: a kind and a JSON body.
+
+        device -> orchestrator   HELLO  {"device_id", "model_type"}
+        device -> orchestrator   READY  {}          idle, asking for the next task
+        orchestrator -> device   TASK   {"msg_id", "task", "model_type", "backlog"}
+        device -> orchestrator   ACK    {"msg_id"}
+        device -> orchestrator   DONE   {"msg_id", "status", "result"}
+        device -> orchestrator   HEARTBEAT {"device_id", "model_type", "queue_depth", "model", "tokens_per_sec"}
+        orchestrator -> device   STOP   {}          no more tasks will be sent
+
+    Tasks wait in a central queue per model type and are handed to whichever device asks
+    for work, so a slow device simply pulls fewer tasks. A TASK that is not acknowledged
+    within ack_timeout is sent again, at most max_retries times, and a task that is not
+    DONE within task_timeout goes back to the front of its queue for another device.
+    Devices acknowledge every copy they get but only hand a msg_id out once. A device whose
+    TASK was never acknowledged gets new work once it is READY again or its heartbeat reports
+    an empty queue, in case only the ACKs got lost. A TASK carries
+    the queue it came from and the queued tasks per connected device, so the device can pick
+    a model for it (see agents/router.py).
+    The result of a DONE (see orchestrator/aggregator.py) is handed to on_result as soon as it arrives.
+    With a DeviceRegistry attached, devices that stop sending heartbeats lose their
+    tasks to other devices and saturated devices are not given more work.
+"""
+
+# queues a device of each model type pulls from, in order of preference,
+# "any" holds tasks whose model type no configured device serves
+STEAL_ORDER = {
+    "thinking": ["thinking", "regular", "any"],
+    "regular": ["regular", "any"],
+}
+
+def encode(kind, body):
+    return [kind.encode("utf-8"), json.dumps(body).encode("utf-8")]
+
+def decode(frames):
+    return frames[0].decode("utf-8"), json.loads(frames[1].decode("utf-8"))
+
+
+class TaskDispatcher:
+    def __init__(self, context, port=5555, ack_timeout=2.0, max_retries=5, task_timeout=600.0, device_types=None,
+                 registry=None, on_result=None):
+        self.port = port
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.task_timeout = task_timeout
+        self.registry = registry  # optional DeviceRegistry fed by the device heartbeats
+        self.on_result = on_result  # called with (task, DONE body) the first time a task is done
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.ROUTER_MANDATORY, 1)  # raise instead of silently dropping unroutable tasks
+        self.socket.setsockopt(zmq.LINGER, 1000)
+        self.socket.bind(f"tcp://*:{port}")
+
+        self.connected = set()  # device ids that sent a message other than a heartbeat and did not expire
+        self.device_types = {str(device_id): model_type for device_id, model_type in (device_types or {}).items()}
+        self.queues = {}  # model type -> deque of msg_ids waiting for a device
+        self.tasks = {}  # msg_id -> (task, model type) of every submitted task
+        self.submitted_at = {}  # msg_id -> time.time() the task was submitted
+        self.idle = []  # device ids that asked for work while the queues were empty, oldest first
+        # device ids whose TASK was never acknowledged, they may be working on it with only the
+        # ACKs lost, so they get work again after a READY or a heartbeat with queue_depth 0
+        self.unconfirmed = set()
+        self.pending = {}  # msg_id -> {"device_id", "task", "attempts", "deadline"} waiting for an ACK
+        self.in_flight = {}  # msg_id -> {"device_id", "started"} handed out and not DONE yet
+        self.acked = set()
+        self.failed = {}  # msg_id -> pending entry that ran out of retries
+        self.completed = {}  # msg_id -> DONE body, with the device that finished it and when
+        self.assigned_at = []  # perf_counter time of every assignment
+        # message ids carry a per-dispatcher session so a restarted orchestrator never reuses one
+        self.session = uuid.uuid4().hex[:8]
+        self._msg_ids = itertools.count(1)
+
+    def _new_msg_id(self):
+        return f"{self.session}-{next(self._msg_ids)}"
+
+    def send(self, device_id, task):
+        """
+        Pushes a task straight to a device and tracks it until it is acknowledged.
+        Returns the message id of the task.
+        """
+        msg_id = self._new_msg_id()
+        self.pending[msg_id] = {"device_id": str(device_id), "task": task, "attempts": 0, "deadline": 0}
+        self._transmit(msg_id)
+        return msg_id
+
+    def submit(self, task, model_type):
+        """
+        Queues a task for the next idle device that can take the model type.
+        Returns the message id of the task.
+        """
+        msg_id = self._new_msg_id()
+        self.tasks[msg_id] = (task, model_type)
+        self.submitted_at[msg_id] = time.time()
+        self.queues.setdefault(model_type, deque()).append(msg_id)
+        self._assign_idle()
+        return msg_id
+
+    def _next_for(self, device_id):
+        model_type = self.device_types.get(device_id)
+        order = STEAL_ORDER.get(model_type, list(self.queues))
+        for queue_type in order:
+            if self.queues.get(queue_type):
+                return self.queues[queue_type].popleft()
+        return None
+
+    def _assign(self, device_id):
+        """
+        Hands the next suitable task to the device, or marks it idle if there is none
+        or the device is saturated.
+        """
+        if self.registry is not None and not self.registry.is_available(device_id):
+            if device_id not in self.idle:
+                self.idle.append(device_id)
+            return False
+
+        msg_id = self._next_for(device_id)
+        if msg_id is None:
+            if device_id not in self.idle:
+                self.idle.append(device_id)
+            return False
+
+        self.in_flight[msg_id] = {"device_id": device_id, "started": time.time()}
+        self.pending[msg_id] = {"device_id": device_id, "task": self.tasks[msg_id][0], "attempts": 0, "deadline": 0,
+                                "model_type": self.tasks[msg_id][1],
+                                "backlog": self.queued() / max(1, len(self.connected))}
+        self.assigned_at.append(time.perf_counter())
+        self._transmit(msg_id)
+        return True
+
+    def _assign_idle(self):
+        for device_id in list(self.idle):
+            self.idle.remove(device_id)
+            self._assign(device_id)
+
+    def _requeue(self, msg_id, reason):
+        """
+        Puts a handed out task back at the front of its queue for another device.
+        """
+        entry = self.in_flight.pop(msg_id)
+        self.pending.pop(msg_id, None)
+        task, model_type = self.tasks[msg_id]
+        print(f"Reassigning task {task.get('id')} from device {entry['device_id']}: {reason}")
+        self.queues[model_type].appendleft(msg_id)
+        self._assign_idle()
+
+    def _transmit(self, msg_id):
+        entry = self.pending[msg_id]
+        entry["attempts"] += 1
+        entry["deadline"] = time.time() + self.ack_timeout
+        try:
+            with span("dispatcher", "send_task"):
+                self.socket.send_multipart([entry["device_id"].encode("utf-8")] +
+                                           encode("TASK", {"msg_id": msg_id, "task": entry["task"],
+                                                           "model_type": entry.get("model_type"),
+                                                           "backlog": entry.get("backlog")}))
+        except zmq.ZMQError:
+            # the device has not connected yet, the retry timer covers it
+            pass
+
+    def _handle(self, device_id, kind, body):
+        if kind == "HEARTBEAT":
+            if self.registry is not None:
+                self.registry.update(body["device_id"], body)
+                # a device that was saturated may have room again
+                self._assign_idle()
+            heartbeat_id = str(body.get("device_id", device_id))
+            if heartbeat_id in self.unconfirmed and body.get("queue_depth") == 0:
+                # the device is not working on anything, its TASK was lost and it still waits for work
+                self.unconfirmed.discard(heartbeat_id)
+                if heartbeat_id not in self.idle:
+                    self._assign(heartbeat_id)
+            return
+
+        # any message shows the device is alive
+        if self.registry is not None:
+            status = {"model_type": body.get("model_type")}
+            if kind in ("READY", "DONE"):
+                # the device finished its task, its last heartbeat may still report it busy
+                status["queue_depth"] = 0
+            self.registry.update(device_id, status)
+        # a device that expired and came back is connected again, so it counts for the backlog and gets STOP
+        self.connected.add(device_id)
+
+        if kind == "HELLO":
+            if body.get("model_type"):
+                self.device_types[device_id] = body["model_type"]
+            # resend whatever was waiting for this device to show up
+            for msg_id, entry in self.pending.items():
+                if entry["device_id"] == device_id:
+                    entry["deadline"] = 0
+        elif kind == "READY":
+            self.unconfirmed.discard(device_id)
+            if device_id not in self.idle:
+                self._assign(device_id)
+        elif kind == "ACK":
+            msg_id = body["msg_id"]
+            if self.pending.pop(msg_id, None) is not None:
+                self.acked.add(msg_id)
+        elif kind == "DONE":
+            msg_id = body["msg_id"]
+            self.pending.pop(msg_id, None)
+            self.in_flight.pop(msg_id, None)
+            # the task may have been requeued after a timeout and not picked up again yet
+            model_type = self.tasks.get(msg_id, (None, None))[1]
+            if msg_id in self.queues.get(model_type, ()):
+                self.queues[model_type].remove(msg_id)
+            # a reassigned task can finish twice, the first result wins
+            if msg_id not in self.completed:
+                self.completed[msg_id] = dict(body, device_id=device_id, submitted=self.submitted_at.get(msg_id),
+                                              finished=time.time())
+                if self.on_result is not None and msg_id in self.tasks:
+                    self.on_result(self.tasks[msg_id][0], self.completed[msg_id])
+
+    def poll(self, timeout_ms=0):
+        """
+        Handles incoming device messages, waiting at most timeout_ms for the first one,
+        then retransmits unacknowledged tasks and reassigns tasks that timed out.
+        """
+        while self.socket.poll(timeout_ms):
+            frames = self.socket.recv_multipart()
+            kind, body = decode(frames[1:])
+            self._handle(frames[0].decode("utf-8"), kind, body)
+            timeout_ms = 0
+
+        if self.registry is not None:
+            for device_id in self.registry.expire():
+                self._drop_device(device_id)
+
+        now = time.time()
+        for msg_id, entry in list(self.pending.items()):
+            if entry["deadline"] > now:
+                continue
+            if entry["attempts"] <= self.max_retries:
+                self._transmit(msg_id)
+            elif msg_id in self.in_flight:
+                self._requeue(msg_id, "never acknowledged")
+                self.unconfirmed.add(entry["device_id"])
+            else:
+                print(f"Task {entry['task'].get('id')} was never acknowledged by device {entry['device_id']}")
+                self.failed[msg_id] = self.pending.pop(msg_id)
+
+        for msg_id, entry in list(self.in_flight.items()):
+            if now - entry["started"] > self.task_timeout:
+                self._requeue(msg_id, f"not done after {self.task_timeout}s")
+
+    def _drop_device(self, device_id):
+        """
+        Forgets a dead device and hands its tasks to the others.
+        """
+        self.connected.discard(device_id)
+        self.unconfirmed.discard(device_id)
+        if device_id in self.idle:
+            self.idle.remove(device_id)
+        for msg_id, entry in list(self.in_flight.items()):
+            if entry["device_id"] == device_id:
+                self._requeue(msg_id, "device stopped sending heartbeats")
+
+    def queued(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def wait_for_acks(self, timeout=None):
+        """
+        Polls until every sent task was acknowledged or gave up, or until the timeout (seconds).
+        Returns True if nothing is left pending.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            self.poll(100)
+        return True
+
+    def wait_until_done(self, timeout=None, stall_timeout=None):
+        """
+        Polls until every submitted task is DONE, until the timeout (seconds), or until no
+        task was done for stall_timeout seconds, e.g. because no device is left.
+        Returns True if no task is left queued or in flight.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        done, last_done = len(self.completed), time.time()
+        while self.queued() or self.in_flight:
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                return False
+            if len(self.completed) != done:
+                done, last_done = len(self.completed), now
+            elif stall_timeout is not None and now - last_done >= stall_timeout:
+                return False
+            self.poll(100)
+        return True
+
+    def unfinished(self):
+        """
+        The submitted tasks that are still queued or in flight.
+        """
+        msg_ids = [msg_id for queue in self.queues.values() for msg_id in queue] + list(self.in_flight)
+        return [self.tasks[msg_id][0] for msg_id in dict.fromkeys(msg_ids)]
+
+    def stop_devices(self):
+        """
+        Tells every connected device that no more tasks will be sent.
+        """
+        for device_id in self.connected:
+            try:
+                self.socket.send_multipart([device_id.encode("utf-8")] + encode("STOP", {}))
+            except zmq.ZMQError:
+                pass
+
+    def close(self):
+        self.socket.close()
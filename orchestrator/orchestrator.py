@@ -2,24 +2,72 @@ import zmq
 import json
 import time
 import os
+import queue
+import threading
 from agents.assignment_agent.assignment_agent import AssignmentAgent
-from orchestrator.publisher import publish_text
+from orchestrator.dispatcher import TaskDispatcher
+from orchestrator.registry import DeviceRegistry
+from orchestrator.aggregator import ResultAggregator
 from shared.log_tools import print_action, log_interaction
+from shared.timing_tools import recent_spans, summarize_usage
 
 class Orchestrator:
-    def __init__(self, model_name, backend, sys_msg, devices):
-        self.assignment_agent = AssignmentAgent(model_name, backend, sys_msg)
+    def __init__(self, model_name, backend, sys_msg, devices, batch_size=10, max_workers=4, cache=None,
+                 pre_classifier=None, confidence_threshold=0.8, task_port=5555,
+                 ack_timeout=2.0, max_retries=5, task_timeout=600.0, heartbeat_expiry=15.0, max_queue_depth=1):
+        self.assignment_agent = AssignmentAgent(model_name, backend, sys_msg, cache=cache,
+                                                pre_classifier=pre_classifier,
+                                                confidence_threshold=confidence_threshold)
         self.devices = devices
         self.context = zmq.Context()
+        # bound once for the whole run, devices connect to it with orchestrator.client.TaskReceiver
+        device_types = {device['id']: model_type for model_type, group in devices.items() for device in group}
+        # live device status from heartbeats, devices join and leave the config as they come and go
+        self.registry = DeviceRegistry(expiry=heartbeat_expiry, max_queue_depth=max_queue_depth,
+                                       on_join=self._device_joined, on_expire=self._device_expired)
+        self.dispatcher = TaskDispatcher(self.context, task_port, ack_timeout=ack_timeout, max_retries=max_retries,
+                                         task_timeout=task_timeout, device_types=device_types,
+                                         registry=self.registry, on_result=self._collect_result)
+        self.aggregator = ResultAggregator()  # results of the current stream_tasks run
         self.total_attempts = 10
+        self.batch_size = batch_size  # tasks packed into one classification prompt
+        self.max_workers = max_workers  # classification prompts in flight at once
+        self.metrics = {}  # timings of the last stream_tasks run
 
 
-    def add_device(self, device):
-        self.devices.append(device)
+    def add_device(self, device, model_type="regular"):
+        group = self.devices.setdefault(model_type, [])
+        if all(str(known['id']) != str(device['id']) for known in group):
+            group.append(device)
 
     def remove_device(self, device):
-        if device in self.devices:
-            self.devices.remove(device)
+        for group in self.devices.values():
+            if device in group:
+                group.remove(device)
+
+    def _find_device(self, device_id):
+        for group in self.devices.values():
+            for device in group:
+                if str(device['id']) == str(device_id):
+                    return device
+        return None
+
+    def _device_joined(self, device_id, status):
+        device = self._find_device(device_id)
+        if device is None:
+            device = {"id": device_id, "ip": None, "port": None, "status": "open"}
+            self.add_device(device, status.get("model_type") or "regular")
+        device['status'] = 'open'
+        print(f"Device {device_id} is up")
+
+    def _device_expired(self, device_id, status):
+        device = self._find_device(device_id)
+        if device is not None:
+            device['status'] = 'closed'
+            self.remove_device(device)
+
+    def _collect_result(self, task, done):
+        self.aggregator.add(task, done)
 
     def get_open_device(self, model_type):
         """
@@ -27,55 +75,147 @@ class Orchestrator:
             If so return the device info 
             else return None
         """
-        for device in self.devices[model_type]:
-            if device['status'] == 'open':
+        for device in self.devices.get(model_type, []):
+            if self.registry.is_available(device['id']):
                 return device 
         return None
 
     
+    def _classify_into_queue(self, task_list, task_queue):
+        """
+            Producer side of stream_tasks, puts every (task, model_type) on the queue
+            as soon as it is classified and None once classification is finished
+        """
+        try:
+            for task, category in self.assignment_agent.iter_classify_task_list(task_list,
+                                                                                batch_size=self.batch_size,
+                                                                                max_workers=self.max_workers):
+                task_queue.put((task, category.replace("_model", "")))
+        except Exception as e:
+            print(f"Classification stopped early: {e}")
+        finally:
+            self.metrics["classification_time"] = time.perf_counter() - self.metrics["start"]
+            task_queue.put(None)
+
+    def _queue_task(self, task, model_type, log_path):
+        # devices pull from the central queues, a model type nobody serves goes to the shared queue
+        if not self.devices.get(model_type):
+            model_type = "any"
+        self.dispatcher.submit(task, model_type)
+        print(f"Queued task {task['id']} for a {model_type} device")
+
+        # log 
+        if log_path:
+            log_interaction(log_path, 
+            {
+                "agent": "orchestrator",
+                "task": task,
+                "model_type": model_type
+            })
+
     def stream_tasks(self, task_list, log_path=""):
-        print_action("=== Assigning Tasks ===", color="blue")
+        """
+            Classifies the tasks and streams them to the devices.
+            Classification runs on a producer thread and every classified task goes
+            straight into the central queue of its model type. Devices pull the next
+            task whenever they are idle and tasks that time out are handed to another
+            device, so the run finishes as fast as the devices together can work.
+            Timing of the last run is kept in self.metrics and the results the devices
+            sent back in self.aggregator
+        """
+        self.aggregator = ResultAggregator(log_path)
         while True:
-            result = self.assignment_agent.classify_task_list(task_list)
-            if len(result['regular_model']) == 0 and len(result['thinking_model']) == 0:
-                self.total_attempts -= 1
-            else:
+            print_action("=== Assigning and Streaming Tasks ===", color="blue")
+            self.metrics = {"start": time.perf_counter(), "started": time.time(), "classification_time": None, "queued": 0}
+            assigned_before = len(self.dispatcher.assigned_at)
+            completed_before = set(self.dispatcher.completed)
+            task_queue = queue.Queue()
+            producer = threading.Thread(target=self._classify_into_queue, args=(task_list, task_queue), daemon=True)
+            producer.start()
+
+            classifying = True
+            while classifying:
+                # keep serving device requests while waiting for the next classified task
+                self.dispatcher.poll(50)
+                while True:
+                    try:
+                        item = task_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        classifying = False
+                        break
+                    self._queue_task(item[0], item[1], log_path)
+                    self.metrics["queued"] += 1
+            producer.join()
+
+            if self.metrics["queued"] > 0:
                 break
 
+            self.total_attempts -= 1
             if self.total_attempts == 0:
                 print("Unable to complete")
                 return False
-        context = zmq.Context()
-
-        print_action("=== Streaming Tasks ===", color="blue")
-        for task_list, model_type in [
-            (result["regular_model"], "regular"),
-            (result["thinking_model"], "thinking")
-        ]:
-            topics = [device['ip'] for device in self.devices[model_type]]
-            print(topics)
-            for i, task in enumerate(task_list):
-                device = self.devices[model_type][i % len(self.devices[model_type])]
-                task_string = str(task['id']) + ": " + task['description']
-
-                ip = device['ip']
-                port = device['port']
-                port = 5001
-
-                publish_text(context, ip, port, topics, task_string)
-                print(f"Sent task {task['id']} to device {device['id']} at {ip}:{port}")
-
-                # log 
-                log_interaction(log_path, 
-                {
-                    "agent": "interaction",
-                    "task": task,
-                    "device": device
-                })
 
+        print_action("=== Waiting for Devices ===", color="blue")
+        # a task is done or handed to another device within task_timeout, so a run without any
+        # task done for twice that long has no device left to finish it
+        if not self.dispatcher.wait_until_done(stall_timeout=2 * self.dispatcher.task_timeout):
+            print(f"No task was done for {2 * self.dispatcher.task_timeout:.0f}s, "
+                  f"giving up on {len(self.dispatcher.unfinished())} tasks")
+
+        assigned_at = self.dispatcher.assigned_at[assigned_before:]
+        classification_end = self.metrics["start"] + self.metrics["classification_time"]
+        completed = [body for msg_id, body in self.dispatcher.completed.items() if msg_id not in completed_before]
+        self.metrics["time_to_first_dispatch"] = assigned_at[0] - self.metrics["start"] if assigned_at else None
+        self.metrics["dispatched"] = len(assigned_at)
+        self.metrics["dispatched_during_classification"] = sum(1 for t in assigned_at if t <= classification_end)
+        self.metrics["completed"] = len(completed)
+        self.metrics["unfinished"] = [task.get("id") for task in self.dispatcher.unfinished()]
+        self.metrics["completed_per_device"] = {}
+        for body in completed:
+            device_id = body["device_id"]
+            self.metrics["completed_per_device"][device_id] = self.metrics["completed_per_device"].get(device_id, 0) + 1
+        self.metrics["makespan"] = time.perf_counter() - self.metrics["start"]
+        self.metrics.update(self.aggregator.summary())
+        # classification runs here, the coding devices report their own usage with every result
+        self.metrics["classification_usage"] = summarize_usage(
+            [record for record in recent_spans()
+             if record["component"] == "AssignmentAgent" and record["started"] >= self.metrics["started"]], by="model")
+
+        if assigned_at:
+            print(f"First task dispatched after {self.metrics['time_to_first_dispatch']:.2f}s, "
+                  f"classification took {self.metrics['classification_time']:.2f}s, "
+                  f"{self.metrics['dispatched_during_classification']}/{self.metrics['dispatched']} tasks "
+                  f"dispatched while classification was still running")
+        print(f"{self.metrics['completed']} tasks completed in {self.metrics['makespan']:.2f}s "
+              f"(per device: {self.metrics['completed_per_device']})")
+        if self.metrics["latency_p50"] is not None:
+            print(f"Throughput {self.metrics['throughput'] or 0:.2f} tasks/s, task latency "
+                  f"p50 {self.metrics['latency_p50']:.2f}s p95 {self.metrics['latency_p95']:.2f}s "
+                  f"p99 {self.metrics['latency_p99']:.2f}s")
+        for model, usage in self.metrics["classification_usage"].items():
+            print(f"Classification with {model}: {usage['calls']} calls, {usage['prompt_tokens']} prompt / "
+                  f"{usage['response_tokens']} response tokens")
+        for device_id, usage in self.metrics["usage_per_device"].items():
+            tokens_per_sec = f"{usage['tokens_per_sec']:.1f}" if usage["tokens_per_sec"] else "-"
+            print(f"Device {device_id}: {usage['prompt_tokens']} prompt / {usage['response_tokens']} response tokens "
+                  f"over {usage['tasks']} tasks, {tokens_per_sec} tokens/s")
+        if log_path:
+            log_interaction(log_path, 
+            {
+                "agent": "orchestrator",
+                "metrics": {key: value for key, value in self.metrics.items() if key != "start"}
+            })
+
+        self.dispatcher.stop_devices()
         print_action("=== Finished Streaming ===", color="blue")
 
         return True
+
+    def close(self):
+        self.dispatcher.close()
+        self.context.term()
     
 
 def main():
@@ -0,0 +1,60 @@
+import time
+
+class DeviceRegistry:
+    """
+    In-memory view of which coding devices are alive and how busy they are.
+    Devices report through HEARTBEAT messages (see orchestrator/dispatcher.py) and any
+    other message they send also counts as a sign of life. A device that has not been
+    heard from for expiry seconds is dropped, and a device whose reported queue depth
+    reached max_queue_depth is alive but saturated.
+    """
+    def __init__(self, expiry=15.0, max_queue_depth=1, on_join=None, on_expire=None):
+        self.expiry = expiry
+        self.max_queue_depth = max_queue_depth
+        self.on_join = on_join  # called with (device_id, status) when a device first shows up
+        self.on_expire = on_expire  # called with (device_id, status) when a device expires
+        self.devices = {}  # device_id -> {"last_seen", "model_type", "queue_depth", "model", "tokens_per_sec"}
+
+    def update(self, device_id, status=None):
+        """
+        Records a heartbeat (or any other message) from the device.
+        """
+        device_id = str(device_id)
+        joined = device_id not in self.devices
+        entry = self.devices.setdefault(device_id, {"model_type": None, "queue_depth": 0,
+                                                    "model": None, "tokens_per_sec": None})
+        entry.update({key: value for key, value in (status or {}).items() if value is not None})
+        entry["last_seen"] = time.time()
+        if joined and self.on_join is not None:
+            self.on_join(device_id, entry)
+
+    def expire(self):
+        """
+        Drops every device that was not heard from within the expiry window.
+        Returns the ids of the dropped devices.
+        """
+        now = time.time()
+        expired = [device_id for device_id, entry in self.devices.items() if now - entry["last_seen"] > self.expiry]
+        for device_id in expired:
+            entry = self.devices.pop(device_id)
+            print(f"Device {device_id} stopped sending heartbeats")
+            if self.on_expire is not None:
+                self.on_expire(device_id, entry)
+        return expired
+
+    def is_alive(self, device_id):
+        entry = self.devices.get(str(device_id))
+        return entry is not None and time.time() - entry["last_seen"] <= self.expiry
+
+    def is_available(self, device_id):
+        """
+        True if the device is alive and has room for another task.
+        """
+        return self.is_alive(device_id) and self.devices[str(device_id)]["queue_depth"] < self.max_queue_depth
+
+    def live_devices(self, model_type=None):
+        return [device_id for device_id, entry in self.devices.items()
+                if self.is_alive(device_id) and (model_type is None or entry["model_type"] == model_type)]
+
+    def status(self, device_id):
+        return self.devices.get(str(device_id))
@@ -2,17 +2,22 @@ import pyfiglet
 import json
 import os
 import zmq 
+import time
 import threading
 import argparse
 from colorama import init, Fore, Style
 from agents.interface_agent.interface_agent import InterfaceAgent 
 from agents.review_agent.review_agent import ReviewAgent
 from agents.coding_agent.coding_agent import CodingAgent
+from agents.router import ModelRouter, estimate_prompt_tokens
 from shared.setup_tools import read_initial_instructions, setup_logs
-from shared.log_tools import log_interaction, print_action
+from shared.log_tools import log_interaction, print_action, get_run_log
+from shared.timing_tools import set_span_log, set_span_labels, span_labels, recent_spans, summarize_usage
 from shared.file_tools import extract_json
+from shared.cache_tools import ClassificationCache
+from agents.assignment_agent.keyword_classifier import KeywordClassifier
 from orchestrator.orchestrator import Orchestrator
-from orchestrator.client import start_handshake_server, text_listener   
+from orchestrator.client import start_handshake_server, TaskReceiver
 
 def parse_args():
     parser = argparse.ArgumentParser(description="SWE Agent Settings")
@@ -21,6 +26,8 @@ def parse_args():
     parser.add_argument("--distributed_config", type=str, default="")
     parser.add_argument("--log_type", type=str, default="test")
     parser.add_argument("--main_device", type=int, help="On distributed setting the task divider, no distributed the main agent", default=1)
+    parser.add_argument("--batch_size", type=int, help="Tasks classified with one prompt by the orchestrator", default=10)
+    parser.add_argument("--max_workers", type=int, help="Classification prompts the orchestrator sends at once", default=4)
     return parser.parse_args()
 
 def run_code_agent(args):
@@ -34,6 +41,7 @@ def run_code_agent(args):
     path = args.instruction_path # "/Users/jerryli/Desktop/python/SWE-Agent/instructions/code_only/test3.json" 
     instructions = read_initial_instructions(path)
     log_path = setup_logs(type=args.log_type)
+    set_span_log(log_path)
     if args.device_config != "":
         with open(args.device_config) as f:   # "instructions/code_only/device.json"
             device_config = json.load(f)
@@ -41,11 +49,23 @@ def run_code_agent(args):
     else:   
         distributed = False
 
-    # intialize agent
-    code_agent = CodingAgent("cogito:3b", 
+    # intialize agent, the model is picked per task by the router ("models" in the device config overrides its routes)
+    router = ModelRouter(device_config.get("models"))
+    device_model_type = device_config["receiver"].get("model_type") or "regular"
+    code_agent = CodingAgent(router.route(device_model_type), 
                              "ollama", 
-                             sys_prompt=instructions['code_prompt']['system_prompt'], 
-                             correction_prompt=instructions['code_prompt']['correction_prompt'])
+                             sys_msg=instructions['code_prompt']['system_prompt'], 
+                             correction_prompt=instructions['code_prompt']['correction_prompt'],
+                             task_analysis_prompt=instructions['code_prompt']['task_analysis_prompt'],
+                             line_identification_prompt=instructions['code_prompt']['line_identification_prompt'], 
+                             action_selection_prompt=instructions['code_prompt']['action_selection_prompt'],
+                             replace_content_prompt=instructions['code_prompt']['replace_content_prompt'], 
+                             add_content_prompt=instructions['code_prompt']['add_content_prompt'], 
+                             new_file_prompt=instructions['code_prompt']['new_file_prompt'],
+                             edit_plan_prompt=instructions['code_prompt'].get('edit_plan_prompt'),
+                             patch_prompt=instructions['code_prompt'].get('patch_prompt')
+                             )
+    code_agent.warm()  # load the model before the first task arrives
 
     # listen for all assigned tasks 
     receiver_ip = device_config["receiver"]["ip"]
@@ -59,24 +79,68 @@ def run_code_agent(args):
     #     daemon=True
     # ).start()
 
-    # tasks = text_listener(context, sender_ip, port=port, topic=receiver_ip)
-    tasks = ["add a \"hello world\" to page.tsx"]
+    set_span_labels(device_id=device_config["receiver"]["id"])
+
+    def device_status():
+        # generation speed over the last few LLM calls, reported with every heartbeat
+        usage = summarize_usage(recent_spans()[-20:], by="model").get(code_agent.model_name, {})
+        return {"model": code_agent.model_name, "tokens_per_sec": usage.get("tokens_per_sec")}
 
-    # complete all assigned tasks 
+    receiver = TaskReceiver(context, sender_ip, port, device_id=device_config["receiver"]["id"],
+                            model_type=device_config["receiver"].get("model_type"),
+                            status=device_status)
+
+    # pull and complete tasks one at a time until the orchestrator is done,
+    # every result is streamed back to the orchestrator's aggregator
     file_tree = """
                     app/
                     page.tsx
                     notrelevant.tsx
                 """
-    for i, task in enumerate(tasks):
-        output = code_agent.analyze_task(file_tree, task, max_tries=10)   # files to modify
+    while True:
+        task = receiver.recv_task()
+        if task is None:
+            break
+        received = time.time()
+        status = "success"
+
+        def attempt(model):
+            code_agent.model_name = model
+            with span_labels(task_id=task.get("id")):
+                return code_agent.execute_task(file_tree, task["description"])   # files to modify
+
+        # start on the model the task's category, size and the current backlog call for,
+        # a larger model retries the task if the analysis found nothing to modify or create
+        category = receiver.current_model_type if receiver.current_model_type in router.routes else device_model_type
+        try:
+            output, model = router.run(category, attempt,
+                                       validate=lambda output: output["modify"] or output["create"],
+                                       prompt_tokens=estimate_prompt_tokens(file_tree, task["description"]),
+                                       load=receiver.current_backlog)
+        except Exception as e:
+            print(f"Task {task.get('id')} failed: {e}")
+            output = {"modify": [], "create": [], "diffs": {}}
+            model = code_agent.model_name
+            status = "fail"
+        finished = time.time()
 
         # result = code_agent.check_status(dummy_script_path, id)
 
         print(output)
+        result = {
+            "task_id": task.get("id"),
+            "analysis": {"modify": output["modify"], "create": output["create"]},
+            "diffs": output.get("diffs", {}),
+            "timings": {"received": received, "finished": finished, "duration": finished - received},
+            "usage": summarize_usage([record for record in recent_spans() if record.get("task_id") == task.get("id")],
+                                     by="device_id").get(str(device_config["receiver"]["id"])),
+            "model": model,
+            "status": status
+        }
+        log_interaction(log_path, {"agent": "coding", "result": result})
+        receiver.task_done(status=status, result=result)
+    receiver.close()
 
-    # send to aggregator
- 
 
 def run_main_agent(args):
     # Render ASCII art banner
@@ -89,6 +153,8 @@ def run_main_agent(args):
     path = args.instruction_path # "/Users/jerryli/Desktop/python/SWE-Agent/instructions/code_only/test3.json" 
     instructions = read_initial_instructions(path)
     log_path = setup_logs(type=args.log_type)
+    get_run_log(log_path, background=True)  # the orchestrator logs every dispatched task, keep it off the hot path
+    set_span_log(log_path)
     if args.device_config != "":
         with open(args.device_config) as f:   # "instructions/code_only/device.json"
             device_config = json.load(f)
@@ -101,13 +167,18 @@ def run_main_agent(args):
         distributed = False
 
     # intialize agents
-    interface_agent = InterfaceAgent("gemma3:4b", "ollama", sys_msg=instructions['interaction_prompt'], temperature=0.5)
-    orchestrator_agent = Orchestrator("cogito:3b", 
+    router = ModelRouter()
+    interface_agent = InterfaceAgent(router.route("interface"), "ollama", sys_msg=instructions['interaction_prompt'], temperature=0.5)
+    orchestrator_agent = Orchestrator(router.route("orchestrator"), 
                                       "ollama", 
                                       sys_msg=instructions['orchestrator_prompt'], 
-                                      devices=distributed_config) if distributed else None
+                                      devices=distributed_config,
+                                      batch_size=args.batch_size,
+                                      max_workers=args.max_workers,
+                                      cache=ClassificationCache(),
+                                      pre_classifier=KeywordClassifier()) if distributed else None
     # TODO temporary intialization fix later
-    code_agent = CodingAgent("cogito:3b", 
+    code_agent = CodingAgent(router.route("regular"), 
                              "ollama", 
                              sys_msg=instructions['code_prompt']['system_prompt'], 
                              correction_prompt=instructions['code_prompt']['correction_prompt'],
@@ -116,16 +187,24 @@ def run_main_agent(args):
                              action_selection_prompt=instructions['code_prompt']['action_selection_prompt'],
                              replace_content_prompt=instructions['code_prompt']['replace_content_prompt'], 
                              add_content_prompt=instructions['code_prompt']['add_content_prompt'], 
-                             new_file_prompt=instructions['code_prompt']['new_file_prompt']
+                             new_file_prompt=instructions['code_prompt']['new_file_prompt'],
+                             edit_plan_prompt=instructions['code_prompt'].get('edit_plan_prompt'),
+                             patch_prompt=instructions['code_prompt'].get('patch_prompt')
                              ) if not distributed else None
 
+    # load the models in the background while the user types the first prompt
+    for agent in (interface_agent, orchestrator_agent.assignment_agent if distributed else None, code_agent):
+        if agent is not None:
+            threading.Thread(target=agent.warm, daemon=True).start()
+
     # interaction 
     while True:
         user_prompt = input(">>> ")
         if user_prompt == "quit": break 
         print_action("Interacting with the user...", color="yellow")
-        output = interface_agent.instruct(user_prompt)
-        print(output)
+        # tokens are printed as they arrive instead of after the whole reply
+        output = interface_agent.instruct(user_prompt, on_token=lambda token: print(token, end="", flush=True))
+        print()
 
         log_interaction(log_path, 
                         {
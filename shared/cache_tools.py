@@ -0,0 +1,95 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+class ClassificationCache:
+    """
+    On-disk cache of task classifications backed by SQLite.
+    Entries are keyed by a hash of (model name, system prompt, task description) so a
+    re-run over the same or an overlapping task list only classifies the new tasks.
+    Once the cache holds more than max_entries the least recently used entries are evicted.
+    """
+    def __init__(self, path="cache/classifications.db", max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # the cache is shared by the classification worker threads, access goes through self._lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            "key TEXT PRIMARY KEY, category TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS classifications_last_used ON classifications (last_used)"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model_name, sys_msg, description):
+        """
+        Returns the content hash used as the cache key.
+        """
+        content = "\0".join([str(model_name), str(sys_msg), str(description).strip()])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached category for the key or None, and marks the entry as recently used.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT category FROM classifications WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE classifications SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.connection.commit()
+            return row[0]
+
+    def put(self, key, category):
+        """
+        Stores a category for the key, evicting the least recently used entries if the cache is full.
+        """
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO classifications (key, category, last_used) VALUES (?, ?, ?)",
+                (key, category, time.time())
+            )
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        count = self.connection.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.connection.execute(
+                "DELETE FROM classifications WHERE key IN "
+                "(SELECT key FROM classifications ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+
+    def stats(self):
+        """
+        Returns the hit / miss counters and the number of cached entries.
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -1,6 +1,10 @@
+import os
 import re
 import json
+import posixpath
+from shared.timing_tools import timed
 
+@timed("file_tools")
 def fetch_files_from_codebase(file_paths: list) -> dict:
     """
     Fetches files from a local repository's codebase.
@@ -21,6 +25,7 @@ def fetch_files_from_codebase(file_paths: list) -> dict:
             pass
     return file_contents
 
+@timed("file_tools")
 def edit_files_from_codebase(file_updates: dict) -> dict:
     """
     Overwrites multiple files in the local codebase with new content.
@@ -43,6 +48,102 @@ def edit_files_from_codebase(file_updates: dict) -> dict:
             results[file_path] = f"error: {str(e)}"
     return results
 
+class PathIndex:
+    """
+    Index of the files of a repository for O(1) existence checks: the set of normalized
+    relative paths plus a basename -> paths map. Build it once per repository from the
+    directory or from its ASCII file tree, and add files to it as they are created.
+    """
+    _TREE_PREFIX = re.compile(r'^[\s│├└─┬┼┌]*')  # indentation and box-drawing connectors
+    IGNORED = {".git", "node_modules", "__pycache__", ".next"}
+
+    def __init__(self, paths=(), root=None):
+        self.root = root  # name of the repository directory, stripped from paths that start with it
+        self.paths = set()
+        self.by_basename = {}
+        for path in paths:
+            self.add(path)
+
+    @staticmethod
+    def normalize(path):
+        """
+        Relative posix form of a path, e.g. ".\\app\\page.tsx" and "/app//page.tsx" both give "app/page.tsx".
+        """
+        path = path.strip().strip('"\'').replace('\\', '/')
+        path = posixpath.normpath(path.lstrip('/'))
+        return "" if path == "." else path
+
+    @classmethod
+    def from_directory(cls, root):
+        """
+        Index of every file below root, the IGNORED directories are skipped.
+        """
+        paths = []
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in cls.IGNORED]
+            relative = os.path.relpath(directory, root)
+            paths.extend(file if relative == "." else os.path.join(relative, file) for file in files)
+        return cls(paths, root=os.path.basename(os.path.abspath(root)))
+
+    @classmethod
+    def from_file_tree(cls, file_tree, root=None):
+        """
+        Index of the files in an ASCII file tree (see repo_to_fileTree), nesting is read from the
+        indentation. root is the repository's name, a top line with that name the rest is nested
+        under is the repository itself and not a directory in it. In a plain listing without
+        connectors, a name ending in "/" holds the names listed under it at the same indentation.
+        """
+        entries = []  # (depth, name, plain) of every line, plain if it has no box-drawing connector
+        for line in file_tree.split('\n'):
+            prefix = cls._TREE_PREFIX.match(line).group()
+            name = line[len(prefix):].strip()
+            if name:
+                entries.append((len(prefix), name, not prefix.strip()))
+
+        if (root and len(entries) > 1 and entries[0][1].rstrip('/') == root
+                and all(depth > entries[0][0] for depth, _, _ in entries[1:])):
+            entries = entries[1:]
+
+        paths, stack = [], []  # stack of (depth, name, flat) of the enclosing directories
+        for i, (depth, name, plain) in enumerate(entries):
+            is_directory = name.endswith('/') or (i + 1 < len(entries) and entries[i + 1][0] > depth)
+            while stack and (stack[-1][0] > depth or (stack[-1][0] == depth and (not stack[-1][2] or is_directory))):
+                stack.pop()
+            if is_directory:
+                has_children = i + 1 < len(entries) and entries[i + 1][0] > depth
+                stack.append((depth, name.rstrip('/'), plain and not has_children))
+            else:
+                paths.append('/'.join([directory for _, directory, _ in stack] + [name]))
+        return cls(paths, root=root)
+
+    def add(self, path):
+        path = self.normalize(path)
+        if path and path not in self.paths:
+            self.paths.add(path)
+            self.by_basename.setdefault(posixpath.basename(path), []).append(path)
+
+    def lookup(self, path):
+        """
+        Returns the indexed path a (model written) path refers to, or None if it is not a file of the repository.
+        A bare file name matches only if exactly one file has that name.
+        """
+        path = self.normalize(path)
+        if path in self.paths:
+            return path
+        if self.root and path.startswith(self.root + '/') and path[len(self.root) + 1:] in self.paths:
+            return path[len(self.root) + 1:]
+        if '/' not in path:
+            matches = self.by_basename.get(path, [])
+            if len(matches) == 1:
+                return matches[0]
+        return None
+
+    def __contains__(self, path):
+        return self.lookup(path) is not None
+
+    def __len__(self):
+        return len(self.paths)
+
 def create_file(name: str, type: str, path: str = "", content: str = "") -> None:
     """
     Creates new file of the file type based on the arguements name and type
@@ -2,6 +2,7 @@ import os
 import requests
 from git import Repo, GitCommandError, exc
 import subprocess
+from shared.timing_tools import timed
 
 # GitHub API URL
 GITHUB_API_URL = "https://api.github.com"
@@ -16,6 +17,7 @@ HEADERS = {
     "Accept": "application/vnd.github+json"
 }
 
+@timed("github")
 def solve_merge_conflicts(repo_path, base_branch, original_task, agent, feature_branch: str = "main",):
     """
     Attempts to merge feature_branch into base_branch. If conflicts occur,
@@ -68,6 +70,7 @@ def solve_merge_conflicts(repo_path, base_branch, original_task, agent, feature_
         print("Unexpected error during merge:", e)
         return False
 
+@timed("github")
 def stage_and_commit_files(repo_path: str, file_paths: list, commit_message: str) -> bool:
     """
     Stages and commits specified files to the local Git repository.
@@ -101,6 +104,7 @@ def stage_and_commit_files(repo_path: str, file_paths: list, commit_message: str
         print(f"Error committing files: {str(e)}")
         return False
 
+@timed("github")
 def get_issue_count(owner: str, repo: str) -> int:
     """
     Retrieves the number of issues in a GitHub repository.
@@ -116,6 +120,7 @@ def get_issue_count(owner: str, repo: str) -> int:
     issues_only = [item for item in all_items if "pull_request" not in item]
     return len(issues_only)
 
+@timed("github")
 def get_github_issue(owner: str, repo: str, issue_number: int) -> dict:
     """
     Retrieves a GitHub issue's details.
@@ -128,6 +133,7 @@ def get_github_issue(owner: str, repo: str, issue_number: int) -> dict:
     response.raise_for_status()
     return response.json()
 
+@timed("github")
 def create_github_issue(owner: str, repo: str, title: str, body: str) -> dict:
     """
     Creates a GitHub issue the specified repository with the given title and body.
@@ -148,6 +154,7 @@ def create_github_issue(owner: str, repo: str, title: str, body: str) -> dict:
 
     return issue
 
+@timed("github")
 def close_github_issue(owner: str, repo: str, issue_number: int) -> dict:
     """
     Closes a GitHub issue in the specified repository.
@@ -164,6 +171,7 @@ def close_github_issue(owner: str, repo: str, issue_number: int) -> dict:
     print("Closed issue:", issue.get("html_url", ""))
     return issue
 
+@timed("github")
 def merge_github_branch(owner: str, repo: str, head: str, base: str = "main") -> dict:
     """
     Merges a GitHub branch into another branch in the specified repository.
@@ -186,6 +194,7 @@ def merge_github_branch(owner: str, repo: str, head: str, base: str = "main") ->
     print(f"Successfully merged {head} into {base}")
     return merge_result
 
+@timed("github")
 def close_github_pull_request(owner: str, repo: str, pull_number: int) -> dict:
     """
     Closes a GitHub pull request in the specified repository.
@@ -202,6 +211,7 @@ def close_github_pull_request(owner: str, repo: str, pull_number: int) -> dict:
     print("Closed pull request:", pr.get("html_url", ""))
     return pr
 
+@timed("github")
 def get_pr_count(owner: str, repo: str) -> dict:
     """
     Retrieves the number of pull requests in a GitHub repository.
@@ -217,6 +227,7 @@ def get_pr_count(owner: str, repo: str) -> dict:
     issues_only = [item for item in all_items if "pull_request" in item]
     return len(issues_only)
 
+@timed("github")
 def get_github_pr(owner: str, repo: str) -> dict:
     """
     Retrieves a GitHub pull request's details.
@@ -228,6 +239,7 @@ def get_github_pr(owner: str, repo: str) -> dict:
     response.raise_for_status()
     return response.json()
 
+@timed("github")
 def create_pull_request(owner, repo, issue_number, branch_name, base="main"):
     """
     Creates a GitHub pull request based on the Owner's repo and issue number under a branch.
@@ -277,6 +289,7 @@ def create_pull_request(owner, repo, issue_number, branch_name, base="main"):
     print("Created PR:", pr.get("html_url", ""))
     return pr
 
+@timed("github")
 def total_prs(owner, repo, head, base):
     """
     Get's the total number of pull requests from a branch to another.
@@ -293,6 +306,7 @@ def total_prs(owner, repo, head, base):
     return len(response.json()) 
 
 
+@timed("github")
 def create_new_branch(owner, repo, new_branch, base = "main"):
     """
     Creates a new branch in the specified GitHub repository.
@@ -319,6 +333,7 @@ def create_new_branch(owner, repo, new_branch, base = "main"):
 
    
 
+@timed("github")
 def fetch_commit_history(owner: str, repo: str):
     """
     Fetch commit history of the repo
@@ -330,6 +345,7 @@ def fetch_commit_history(owner: str, repo: str):
     response = requests.get(url, headers = HEADERS, params = params)
     return response.json()
 
+@timed("github")
 def create_new_branch(owner, repo, new_branch, base = "main"):
     """
     Creates a new branch in the specified GitHub repository.
@@ -354,6 +370,7 @@ def create_new_branch(owner, repo, new_branch, base = "main"):
         print("Branch created.")
 
     
+@timed("github")
 def fetch_commit_history(owner: str, repo: str):
     """
     Fetch commit history of the repo
@@ -409,6 +426,7 @@ def edit_files_from_codebase(file_updates: dict) -> dict:
 
 
 
+@timed("github")
 def clone_repo(owner: str, repo: str, destination: str = ".") -> str:
     """
     Clones a GitHub repository using Git.
@@ -434,6 +452,7 @@ def clone_repo(owner: str, repo: str, destination: str = ".") -> str:
 
 
 
+@timed("github")
 def ensure_repo_cloned(owner: str, repo: str, destination: str = ".") -> str:
     """
     Ensures that the GitHub repository is cloned locally.
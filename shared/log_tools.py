@@ -1,17 +1,122 @@
+import os
 import json
+import queue
+import atexit
+import argparse
+import threading
 from datetime import datetime
 
+class RunLog:
+    """
+    Append-only JSONL run log, one {"seq", "timestamp", "data"} event per line.
+    Every event gets the next sequence number, so events logged within the same second
+    keep their order and never overwrite each other. With background=True events are
+    queued and a writer thread appends them, so logging never waits on the disk.
+    """
+    def __init__(self, path, background=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.seq = self._last_seq() + 1
+        self.file = open(path, 'a', buffering=1, encoding='utf-8')  # line buffered, every event is flushed
+        self.queue = None
+        self.writer = None
+        if background:
+            self.queue = queue.Queue()
+            self.writer = threading.Thread(target=self._write_loop, daemon=True)
+            self.writer.start()
+
+    def _last_seq(self):
+        # continue the numbering of a log that is reopened
+        last = 0
+        for event in read_log(self.path):
+            last = event["seq"]
+        return last
+
+    def write(self, data):
+        """
+        Logs one event and returns its sequence number.
+        """
+        with self.lock:
+            event = {"seq": self.seq, "timestamp": datetime.now().isoformat(), "data": data}
+            self.seq += 1
+            if self.queue is None:
+                self.file.write(json.dumps(event, default=str) + "\n")
+            else:
+                self.queue.put(event)
+        return event["seq"]
+
+    def _write_loop(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            self.file.write(json.dumps(event, default=str) + "\n")
+
+    def close(self):
+        """
+        Writes out whatever the background writer still has queued and closes the file.
+        """
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        self.file.close()
+
+
+_run_logs = {}  # path -> open RunLog
+_run_logs_lock = threading.Lock()
+
+def get_run_log(path, background=False):
+    """
+    Returns the open RunLog of the path, opening it on first use.
+    """
+    with _run_logs_lock:
+        if path not in _run_logs:
+            _run_logs[path] = RunLog(path, background=background)
+        return _run_logs[path]
+
+def close_logs():
+    with _run_logs_lock:
+        for run_log in _run_logs.values():
+            run_log.close()
+        _run_logs.clear()
+
+atexit.register(close_logs)
+
 def log_interaction(path, data):
-    with open(path, 'r') as f:
-        full_data = json.load(f)
+    get_run_log(path).write(data)
 
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+def read_log(path):
+    """
+    Yields the events of a JSONL run log in order, skipping a line cut off by a crash.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
 
-    full_data[timestamp] = data
+def compact_log(path, out_path=None):
+    """
+    Exports a JSONL run log in the old {timestamp: data} shape, events within the same
+    second get their sequence number appended to the key instead of being overwritten.
+    Writes the result to out_path if given and returns it.
+    """
+    full_data = {}
+    for event in read_log(path):
+        key = datetime.fromisoformat(event["timestamp"]).strftime('%Y%m%d_%H%M%S')
+        if key in full_data:
+            key = f"{key}_{event['seq']}"
+        full_data[key] = event["data"]
+
+    if out_path:
+        with open(out_path, 'w') as f:
+            json.dump(full_data, f, indent=2)
+    return full_data
 
-    with open(path, 'w') as f:
-        json.dump(full_data, f, indent=2)
-        
 
 def log_orchestrator():
     pass
@@ -30,5 +135,12 @@ def print_action(text, color="green"):
         "white": "\033[97m"
     }
     reset_color = "\033[0m"
-    
-    print(f"{color_map[color]}{text}{reset_color}")
\ No newline at end of file
+
+    print(f"{color_map[color]}{text}{reset_color}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a JSONL run log in the old JSON shape")
+    parser.add_argument("log_path", type=str)
+    parser.add_argument("out_path", type=str)
+    args = parser.parse_args()
+    compact_log(args.log_path, args.out_path)
@@ -0,0 +1,324 @@
+import os
+import re
+import difflib
+import tempfile
+from shared.timing_tools import timed
+
+"""
+    Applies model written patches to files so the model only has to emit the changed regions.
+    Accepts unified diffs and SEARCH/REPLACE blocks:
+
+        <<<<<<< SEARCH
+        lines to find
+        =======
+        lines to put there instead
+        >>>>>>> REPLACE
+
+    Every hunk is located in the original file, exactly first, then ignoring whitespace, then
+    by similarity (fuzzy), the line number of a unified diff hunk only breaks ties. A patch is
+    applied all or nothing: if any hunk is rejected the file is left as it was and every
+    rejection is reported with the hunk, the reason and the line it was expected at.
+"""
+
+FUZZY_THRESHOLD = 0.8  # minimum similarity of a fuzzy match
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+# markers may be indented, e.g. when the model copies the indentation of the prompt
+_SEARCH = re.compile(r'^\s*<{5,9} ?SEARCH\s*$')
+_DIVIDER = re.compile(r'^\s*={5,9}\s*$')
+_REPLACE = re.compile(r'^\s*>{5,9} ?REPLACE\s*$')
+
+def _hunk(old, new, line=None, path=None):
+    # line is the 1-based line the old lines are expected at, None if unknown
+    return {"old": old, "new": new, "line": line, "path": path}
+
+def parse_unified_diff(text):
+    """
+    Returns the hunks of a unified diff, each with the path of the file it belongs to
+    (without the a/ b/ prefix, None if the diff has no file headers).
+    """
+    hunks = []
+    path = None
+    current = None
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        # inside a hunk "--- x" is a removed "-- x" line (SQL, Lua) unless a "+++ " header follows
+        if line.startswith('--- ') and (current is None or lines[i + 1:i + 2] and lines[i + 1].startswith('+++ ')):
+            current = None
+            continue
+        if line.startswith('+++ ') and current is None:
+            path = line[4:].split('\t')[0].strip()
+            path = None if path == '/dev/null' else re.sub(r'^[ab]/', '', path)
+            current = None
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header:
+            start = int(header.group(1))
+            # an empty old range (-5,0) inserts after its line
+            current = _hunk([], [], (start + 1 if header.group(2) == '0' else start) or None, path)
+            hunks.append(current)
+            continue
+        if current is None or line.startswith('\\'):
+            continue
+        if line.startswith('-'):
+            current["old"].append(line[1:])
+        elif line.startswith('+'):
+            current["new"].append(line[1:])
+        elif line.startswith(' ') or line == '':
+            # models often drop the leading space of empty context lines
+            current["old"].append(line[1:])
+            current["new"].append(line[1:])
+        else:
+            current = None
+    # a trailing empty line of the text is not context
+    for hunk in hunks:
+        while hunk["old"] and hunk["new"] and hunk["old"][-1] == '' and hunk["new"][-1] == '':
+            hunk["old"].pop()
+            hunk["new"].pop()
+    return [hunk for hunk in hunks if hunk["old"] or hunk["new"]]
+
+def parse_search_replace(text):
+    """
+    Returns the hunks of SEARCH/REPLACE blocks, a file path on the line in front of a
+    block (outside of a code fence) is kept as the hunk's path.
+    """
+    hunks = []
+    lines = text.split('\n')
+    i = 0
+    while i < len(lines):
+        if not _SEARCH.match(lines[i]):
+            i += 1
+            continue
+        previous = lines[i - 1].strip() if i > 0 else ''
+        if previous.startswith('```') and i > 1:
+            previous = lines[i - 2].strip()
+        path = previous if previous and ' ' not in previous and not previous.startswith(('```', '>>>', '===')) else None
+        # the indentation of the markers is not part of the block's lines
+        indent = lines[i][:len(lines[i]) - len(lines[i].lstrip())]
+
+        def dedent(line):
+            return line[len(indent):] if line.startswith(indent) else line.lstrip()
+
+        old, new = [], []
+        i += 1
+        while i < len(lines) and not _DIVIDER.match(lines[i]):
+            old.append(dedent(lines[i]))
+            i += 1
+        i += 1
+        while i < len(lines) and not _REPLACE.match(lines[i]):
+            new.append(dedent(lines[i]))
+            i += 1
+        i += 1
+        hunks.append(_hunk(old, new, None, path))
+    return hunks
+
+def parse_patch(text):
+    """
+    Returns the hunks of model output in either format, [] if it contains no patch.
+    """
+    if any(_SEARCH.match(line) for line in text.split('\n')):
+        return parse_search_replace(text)
+    return parse_unified_diff(text)
+
+def _normalize(line):
+    return ' '.join(line.split())
+
+def _find(lines, old, hint):
+    """
+    Returns (start, how) of the best place of the old lines in lines, how is "exact",
+    "whitespace" or "fuzzy", or (None, reason) if there is no single best place.
+    """
+    size = len(old)
+    candidates = range(len(lines) - size + 1)
+
+    def nearest(starts):
+        if len(starts) > 1 and hint is None:
+            return None
+        return min(starts, key=lambda start: abs(start + 1 - hint)) if hint else starts[0]
+
+    normalized = [_normalize(line) for line in lines]
+    for how, keyed, target in (("exact", lines, old), ("whitespace", normalized, [_normalize(line) for line in old])):
+        starts = [start for start in candidates if keyed[start] == target[0] and keyed[start:start + size] == target]
+        if starts:
+            start = nearest(starts)
+            if start is None:
+                return None, f"{how} match at lines {', '.join(str(s + 1) for s in starts)} is ambiguous"
+            return start, how
+
+    target = '\n'.join(_normalize(line) for line in old)
+    best, best_ratio = [], FUZZY_THRESHOLD
+    for start in candidates:
+        window = '\n'.join(normalized[start:start + size])
+        matcher = difflib.SequenceMatcher(None, target, window, autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = [start], ratio
+        elif ratio == best_ratio:
+            best.append(start)
+    if best:
+        start = nearest(best)
+        if start is None:
+            return None, f"fuzzy match at lines {', '.join(str(s + 1) for s in best)} is ambiguous"
+        return start, "fuzzy"
+    return None, "no match for the context lines"
+
+def apply_patch(content, hunks):
+    """
+    Applies the hunks to the content of one file.
+
+    Returns:
+        (new_content, rejections): the patched content, or the unchanged content if any
+        hunk was rejected, and a list of {"hunk", "line", "reason", "context"} per rejected hunk
+    """
+    newline = '\r\n' if '\r\n' in content else '\n'
+    lines = content.split(newline)
+    # an empty (or new) file has no lines, what is inserted into it ends with a newline
+    trailing = content == "" or (len(lines) > 1 and lines[-1] == '')
+    if trailing:
+        lines.pop()
+
+    spans, rejections = [], []
+    for index, hunk in enumerate(hunks):
+        if not hunk["old"]:
+            # pure insertion, only possible with a line number or into an empty file
+            if hunk["line"] is None and lines:
+                rejections.append({"hunk": index, "line": None, "reason": "insertion without a line number",
+                                   "context": ""})
+                continue
+            at = min(len(lines), max(0, (hunk["line"] or 1) - 1)) if lines else 0
+            spans.append((at, at, hunk["new"], index))
+            continue
+        start, how = _find(lines, hunk["old"], hunk["line"])
+        if start is None:
+            rejections.append({"hunk": index, "line": hunk["line"], "reason": how, "context": hunk["old"][0]})
+            continue
+        spans.append((start, start + len(hunk["old"]), hunk["new"], index))
+
+    spans.sort()
+    for (start, end, _, _), (next_start, next_end, _, index) in zip(spans, spans[1:]):
+        if next_start < end or (next_start == start and next_end == end):
+            rejections.append({"hunk": index, "line": next_start + 1, "reason": "overlaps another hunk",
+                               "context": lines[next_start] if next_start < len(lines) else ""})
+    if rejections:
+        return content, sorted(rejections, key=lambda rejection: rejection["hunk"])
+
+    # bottom-up, so the positions of the earlier hunks stay valid
+    for start, end, new, _ in reversed(spans):
+        lines[start:end] = new
+    return newline.join(lines) + (newline if trailing and lines else ''), []
+
+def format_rejections(rejections):
+    """
+    One line per rejected hunk, e.g. to send back to the model.
+    """
+    return '\n'.join(f"hunk {rejection['hunk'] + 1}"
+                     f"{' at line ' + str(rejection['line']) if rejection['line'] else ''}: {rejection['reason']}"
+                     f"{' (' + rejection['context'].strip() + ')' if rejection['context'].strip() else ''}"
+                     for rejection in rejections)
+
+def _write_temp(path, content, newline=None):
+    """
+    Writes the content to a temporary file next to path, with the mode of path if it exists,
+    and returns the temporary file's path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".patch-")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline=newline) as f:
+            f.write(content)
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def _make_parents(path):
+    """
+    Creates the missing parent directories of path and returns them, outermost first.
+    """
+    missing = []
+    directory = os.path.dirname(os.path.abspath(path))
+    while not os.path.isdir(directory) and os.path.dirname(directory) != directory:
+        missing.append(directory)
+        directory = os.path.dirname(directory)
+    for directory in reversed(missing):
+        os.mkdir(directory)
+    return missing[::-1]
+
+def write_atomic(path, content, newline=None):
+    """
+    Writes the file through a temporary file in the same directory, so readers never see it half written.
+    newline is passed to open, "" writes the line endings of the content as they are.
+    """
+    temp_path = _write_temp(path, content, newline)
+    try:
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+def write_all_atomic(contents, newline=None):
+    """
+    Writes {path: content} like write_atomic, but only replaces any file once every temporary
+    file was written. Missing parent directories are created and removed again if a write fails.
+    """
+    created, temp_paths = [], {}
+    try:
+        for path, content in contents.items():
+            created.extend(_make_parents(path))
+            temp_paths[path] = _write_temp(path, content, newline)
+    except Exception:
+        for temp_path in temp_paths.values():
+            os.remove(temp_path)
+        for directory in reversed(created):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        raise
+    for path, temp_path in temp_paths.items():
+        os.replace(temp_path, path)
+
+@timed("patch_tools")
+def apply_patch_to_files(patch, base_path="", default_path=None):
+    """
+    Applies a patch that may touch several files, all files are written or none.
+    Hunks without a path go to default_path, paths that resolve outside base_path are rejected.
+
+    Returns:
+        dict: {file path: list of rejections}, empty lists everywhere if the patch was applied
+    """
+    by_path = {}
+    for hunk in parse_patch(patch):
+        by_path.setdefault(hunk["path"] or default_path, []).append(hunk)
+    if not by_path:
+        return {default_path: [{"hunk": 0, "line": None, "reason": "no patch found", "context": ""}]}
+
+    abs_base = os.path.abspath(base_path)
+    results, patched = {}, {}
+    for path, hunks in by_path.items():
+        if path is None:
+            results[path] = [{"hunk": 0, "line": None, "reason": "hunk without a file path", "context": ""}]
+            continue
+        # the paths come from the model, none may lead out of the base directory
+        full_path = os.path.abspath(os.path.join(abs_base, path))
+        if os.path.commonpath([abs_base, full_path]) != abs_base:
+            results[path] = [{"hunk": 0, "line": None, "reason": "path outside the base directory", "context": path}]
+            continue
+        try:
+            with open(full_path, 'r', encoding='utf-8', newline='') as f:
+                content = f.read()
+        except (FileNotFoundError, NotADirectoryError):
+            content = ""
+        patched[full_path], results[path] = apply_patch(content, hunks)
+
+    if any(results.values()):
+        return results
+    try:
+        write_all_atomic(patched, newline='')
+    except OSError as e:
+        return {path: [{"hunk": 0, "line": None, "reason": f"not written: {e}", "context": ""}] for path in results}
+    return results
@@ -19,14 +19,13 @@ def read_initial_instructions(path):
 def setup_logs(type="runs", os_type="mac"):
     # create new log file
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    file_name = f'{timestamp}.json'
+    file_name = f'{timestamp}.jsonl'
     absolute_path = os.path.abspath("logs")
     if os_type=="mac" or os_type=="linux": log_path = absolute_path + "/" + type + "/" + file_name 
     else: log_path = absolute_path + "\\" + type + "\\" + file_name
 
-    # write to folder based on type
-    with open(log_path, 'w') as f:
-        json.dump({}, f)
+    # write to folder based on type, events are appended one JSON line each (see shared/log_tools.py)
+    open(log_path, 'w').close()
 
     print("Log Created: ", file_name)
 
@@ -0,0 +1,201 @@
+import math
+import time
+import argparse
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from shared.log_tools import log_interaction, read_log
+
+"""
+    Lightweight span timers for the hot paths (LLM calls, file and git I/O, ZMQ sends).
+    Every finished span is kept in memory and, once set_span_log was called with the run
+    log, written to it as {"agent": "span", "span": {...}} so a run can be summarized afterwards.
+    Spans of LLM calls also carry token counts and timings (see record_tokens) and are
+    labelled with e.g. the task and device they ran for, so usage can be rolled up by any label.
+"""
+
+_span_log = {"path": ""}
+_global_labels = {}  # labels of every span of this process, e.g. device_id
+_labels = threading.local()  # labels of the spans of the current thread, e.g. task_id
+_spans = deque(maxlen=10000)  # most recent spans of this process
+_spans_lock = threading.Lock()
+
+def set_span_log(path):
+    """
+    Sends every following span to the run log at path, "" turns logging off.
+    """
+    _span_log["path"] = path
+
+def set_span_labels(**labels):
+    """
+    Adds labels to every following span of the process.
+    """
+    _global_labels.update(labels)
+
+@contextmanager
+def span_labels(**labels):
+    """
+    Adds labels to the spans the current thread opens inside the with block.
+    """
+    previous = getattr(_labels, "values", {})
+    _labels.values = dict(previous, **labels)
+    try:
+        yield
+    finally:
+        _labels.values = previous
+
+def current_span_labels():
+    """
+    The labels span_labels set on the current thread, worker threads start without them
+    so pass these on with span_labels(**labels) inside the worker.
+    """
+    return dict(getattr(_labels, "values", {}))
+
+@contextmanager
+def span(component, stage, model=None, **fields):
+    """
+    Times the body of a with block. Yields the span record so the body can add
+    fields to it, e.g. the token counts of an LLM response (see record_tokens).
+    """
+    record = {"component": component, "stage": stage, "model": model,
+              "prompt_tokens": None, "response_tokens": None}
+    record.update(_global_labels)
+    record.update(getattr(_labels, "values", {}))
+    record.update(fields)
+    record["started"] = time.time()
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - start
+        with _spans_lock:
+            _spans.append(record)
+        if _span_log["path"]:
+            log_interaction(_span_log["path"], {"agent": "span", "span": record})
+
+def timed(component, stage=None):
+    """
+    Decorator form of span, the stage defaults to the function name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(component, stage or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_tokens(record, response):
+    """
+    Copies the token counts and timings of an ollama chat response into the span record,
+    ollama reports durations in nanoseconds.
+    """
+    def seconds(key):
+        value = response.get(key)
+        return None if value is None else value / 1e9
+
+    record["prompt_tokens"] = response.get("prompt_eval_count")
+    record["response_tokens"] = response.get("eval_count")
+    record["load_time"] = seconds("load_duration")
+    record["prompt_eval_time"] = seconds("prompt_eval_duration")
+    record["eval_time"] = seconds("eval_duration")
+    record["tokens_per_sec"] = (record["response_tokens"] / record["eval_time"]
+                                if record["response_tokens"] and record["eval_time"] else None)
+
+def recent_spans():
+    with _spans_lock:
+        return list(_spans)
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile (p in [0, 100]) of the values, None if there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize_spans(spans):
+    """
+    Groups spans by component and stage and returns count, total and p50/p95/p99 duration of each,
+    slowest total first.
+    """
+    durations = {}
+    for record in spans:
+        durations.setdefault(f"{record['component']}.{record['stage']}", []).append(record["duration"])
+    summary = {
+        stage: {
+            "count": len(values),
+            "total": sum(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+        for stage, values in durations.items()
+    }
+    return dict(sorted(summary.items(), key=lambda item: item[1]["total"], reverse=True))
+
+def summarize_usage(spans, by="component"):
+    """
+    Rolls the token counts of the LLM spans up by a span field (component, model, task_id,
+    device_id, ...) and returns calls, tokens, load time and tokens/sec of each value.
+    """
+    usage = {}
+    for record in spans:
+        if record.get("prompt_tokens") is None and record.get("response_tokens") is None:
+            continue
+        entry = usage.setdefault(str(record.get(by)), {"calls": 0, "prompt_tokens": 0, "response_tokens": 0,
+                                                       "load_time": 0.0, "eval_time": 0.0, "tokens_per_sec": None})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += record.get("prompt_tokens") or 0
+        entry["response_tokens"] += record.get("response_tokens") or 0
+        entry["load_time"] += record.get("load_time") or 0
+        entry["eval_time"] += record.get("eval_time") or 0
+    for entry in usage.values():
+        if entry["eval_time"] > 0:
+            entry["tokens_per_sec"] = entry["response_tokens"] / entry["eval_time"]
+    return dict(sorted(usage.items(), key=lambda item: item[1]["prompt_tokens"] + item[1]["response_tokens"],
+                       reverse=True))
+
+def logged_spans(path):
+    """
+    Yields the spans recorded in a run log.
+    """
+    for event in read_log(path):
+        if isinstance(event.get("data"), dict) and event["data"].get("agent") == "span":
+            yield event["data"]["span"]
+
+def summarize_log(path):
+    """
+    Summarizes the spans recorded in a run log.
+    """
+    return summarize_spans(logged_spans(path))
+
+def print_usage(usage, by):
+    print(f"{by:<30} {'calls':>6} {'prompt':>9} {'response':>9} {'load':>8} {'tok/s':>8}")
+    for key, entry in usage.items():
+        tokens_per_sec = f"{entry['tokens_per_sec']:.1f}" if entry["tokens_per_sec"] else "-"
+        print(f"{key:<30} {entry['calls']:>6} {entry['prompt_tokens']:>9} {entry['response_tokens']:>9} "
+              f"{entry['load_time']:>7.2f}s {tokens_per_sec:>8}")
+
+def print_summary(summary):
+    print(f"{'stage':<40} {'count':>6} {'total':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stage, stats in summary.items():
+        print(f"{stage:<40} {stats['count']:>6} {stats['total']:>8.2f}s {stats['p50']:>7.3f}s "
+              f"{stats['p95']:>7.3f}s {stats['p99']:>7.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency and token usage report of a run log")
+    parser.add_argument("log_path", type=str)
+    parser.add_argument("--usage", type=str, default="", help="Roll token usage up by this span field instead, "
+                                                               "e.g. component, model, task_id, device_id")
+    args = parser.parse_args()
+    if args.usage:
+        print_usage(summarize_usage(logged_spans(args.log_path), by=args.usage), args.usage)
+    else:
+        print_summary(summarize_log(args.log_path))
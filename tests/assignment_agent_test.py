@@ -0,0 +1,73 @@
+import re
+import time
+from agents.backends import FakeBackend
+from agents.assignment_agent.assignment_agent import AssignmentAgent
+
+TASKS = [{"id": str(i), "description": description} for i, description in enumerate([
+    "Add a header to the landing page",
+    "Build the login API with JWT authentication",
+    "Style the footer links",
+    "Add a database migration for orders",
+    "Center the hero image",
+    "Write the REST API for payments",
+    "Set up the project's eslint config",
+    "Cache database queries behind the API",
+], start=1)]
+
+def expected(task):
+    return "thinking_model" if re.search(r"API|database", task["description"]) else "regular_model"
+
+def prompt_tasks(messages):
+    # the "<id>: <description>" lines of a classify_task or classify_task_batch prompt
+    return [{"id": task_id, "description": description}
+            for task_id, description in re.findall(r'^\s*(\d+): (.+)$', messages[-1]["content"], re.MULTILINE)]
+
+def answer(tasks, batch=True):
+    if not batch:
+        return expected(tasks[0])
+    return "{" + ", ".join(f'"{task["id"]}": "{expected(task)}"' for task in tasks) + "}"
+
+def test_malformed_batch_is_split():
+    print("\nTesting: malformed batch answers are split and retried")
+    def responder(messages):
+        tasks = prompt_tasks(messages)
+        if len(tasks) == 4:
+            return answer(tasks)[:30]  # cut off in the middle, no valid JSON
+        if len(tasks) == 2:
+            return answer(tasks[:1])  # the second task is missing from the answer
+        return answer(tasks, batch=False)
+    backend = FakeBackend(responder=responder)
+    agent = AssignmentAgent("fake", backend)
+
+    categories = agent._classify_chunk(TASKS[:4])
+    assert categories == {task["id"]: expected(task) for task in TASKS[:4]}, f"Tasks went missing: {categories}"
+    # the batch of 4, both halves of 2 and a single retry for the task missing from each half
+    assert len(backend.calls) == 5, f"Unexpected number of model calls {len(backend.calls)}"
+    print("Passed: malformed batch answers are split and retried")
+
+def test_parallel_results_keep_input_order():
+    print("\nTesting: parallel classification keeps the input order")
+    def responder(messages):
+        tasks = prompt_tasks(messages)
+        # the first batches answer last
+        time.sleep(0.05 * (len(TASKS) - int(tasks[0]["id"])))
+        return answer(tasks, batch=len(tasks) > 1)
+    agent = AssignmentAgent("fake", FakeBackend(responder=responder))
+
+    yielded = [task["id"] for task, _ in agent.iter_classify_task_list(TASKS, batch_size=2, max_workers=4)]
+    assert sorted(yielded) == sorted(task["id"] for task in TASKS), f"Every task should be yielded, got {yielded}"
+
+    result = agent.classify_task_list(TASKS, batch_size=2, max_workers=4)
+    for category in ("regular_model", "thinking_model"):
+        ids = [task["id"] for task in result[category]]
+        assert ids == [task["id"] for task in TASKS if expected(task) == category], f"{category} out of order: {ids}"
+    print("Passed: parallel classification keeps the input order")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_malformed_batch_is_split()
+    test_parallel_results_keep_input_order()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import time
+import asyncio
+from agents.backends import FakeBackend, get_backend
+
+def test_fake_backend_is_deterministic():
+    print("\nTesting: FakeBackend responses")
+    backend = FakeBackend(responses=["regular_model", "thinking_model"])
+    messages = [{"role": "system", "content": "classify"}, {"role": "user", "content": "add a navbar"}]
+    answers = [backend.chat("m", messages)["message"]["content"] for _ in range(3)]
+    assert answers == ["regular_model", "thinking_model", "regular_model"], f"Unexpected answers {answers}"
+    response = get_backend("fake").chat("m", messages, keep_alive="30m")
+    assert response["message"]["content"] == "add a navbar", "Without responses the last message is echoed"
+    assert response["prompt_eval_count"] == 4 and response["eval_count"] == 3, "Token counts should be words"
+    print("Passed: FakeBackend responses")
+
+def test_stream_reassembles_the_response():
+    print("\nTesting: streaming")
+    backend = FakeBackend(responses=["START_CODE print(1) END_CODE"])
+    chunks = list(backend.stream("m", [{"role": "user", "content": "write code"}]))
+    assert "".join(chunk["message"]["content"] for chunk in chunks) == "START_CODE print(1) END_CODE"
+    assert chunks[-1]["done"] and chunks[-1]["eval_count"] == 3, "Last chunk should carry the token counts"
+    print("Passed: streaming")
+
+def test_batch_and_async_run_concurrently():
+    print("\nTesting: concurrent batch / async")
+    backend = FakeBackend(responder=lambda messages: messages[-1]["content"].upper(), delay=0.1)
+    conversations = [[{"role": "user", "content": f"task {i}"}] for i in range(8)]
+
+    start = time.perf_counter()
+    answers = [response["message"]["content"] for response in backend.batch("m", conversations, max_workers=8)]
+    assert answers == [f"TASK {i}" for i in range(8)], "Batch should keep the input order"
+    assert time.perf_counter() - start < 0.5, "Batch calls should overlap"
+
+    async def run():
+        return await asyncio.gather(*(backend.achat("m", messages) for messages in conversations))
+    start = time.perf_counter()
+    responses = asyncio.run(run())
+    assert [response["message"]["content"] for response in responses] == answers
+    assert time.perf_counter() - start < 0.5, "Async calls should overlap"
+    print("Passed: concurrent batch / async")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_fake_backend_is_deterministic()
+    test_stream_reassembles_the_response()
+    test_batch_and_async_run_concurrently()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
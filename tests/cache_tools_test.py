@@ -0,0 +1,52 @@
+import os
+import tempfile
+from shared.cache_tools import ClassificationCache
+
+def test_cache_hit_and_miss():
+    print("\nTesting: ClassificationCache hit / miss")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ClassificationCache(os.path.join(tmp_dir, "cache.db"))
+        key = ClassificationCache.make_key("cogito:3b", "sys", "Add a login page")
+
+        assert cache.get(key) is None, "Empty cache should miss"
+        cache.put(key, "thinking_model")
+        assert cache.get(key) == "thinking_model", "Stored category should be returned"
+        assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}, f"Unexpected stats {cache.stats()}"
+        cache.close()
+    print("Passed: ClassificationCache hit / miss")
+
+def test_cache_key_depends_on_model_and_prompt():
+    print("\nTesting: ClassificationCache.make_key")
+    key = ClassificationCache.make_key("cogito:3b", "sys", "Add a login page")
+    assert key == ClassificationCache.make_key("cogito:3b", "sys", "Add a login page  "), "Key should ignore surrounding whitespace"
+    assert key != ClassificationCache.make_key("gemma3:4b", "sys", "Add a login page"), "Key should depend on the model"
+    assert key != ClassificationCache.make_key("cogito:3b", "other", "Add a login page"), "Key should depend on the system prompt"
+    print("Passed: ClassificationCache.make_key")
+
+def test_cache_persists_and_evicts_lru():
+    print("\nTesting: ClassificationCache persistence and LRU eviction")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "cache.db")
+        cache = ClassificationCache(path, max_entries=2)
+        cache.put("a", "regular_model")
+        cache.put("b", "thinking_model")
+        cache.get("a")  # "b" is now the least recently used entry
+        cache.put("c", "regular_model")
+        cache.close()
+
+        cache = ClassificationCache(path, max_entries=2)
+        assert cache.get("b") is None, "Least recently used entry should be evicted"
+        assert cache.get("a") == "regular_model", "Recently used entry should survive a restart"
+        assert cache.get("c") == "regular_model", "Newest entry should survive a restart"
+        cache.close()
+    print("Passed: ClassificationCache persistence and LRU eviction")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_cache_hit_and_miss()
+    test_cache_key_depends_on_model_and_prompt()
+    test_cache_persists_and_evicts_lru()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+from agents.coding_agent.context_window import relevant_windows, render_windows, task_terms
+
+def make_file(components=40, lines_per_component=20):
+    """
+    A large TSX file of many small components.
+    """
+    lines = ["import React from 'react';", ""]
+    for i in range(components):
+        lines.append(f"export function Widget{i}() {{")
+        lines.extend(f"  const value{j} = {j};" for j in range(lines_per_component - 3))
+        lines.append(f"  return <div>widget {i}</div>;")
+        lines.append("}")
+    return lines
+
+def test_windows_keep_relevant_chunk():
+    print("\nTesting: only the relevant component is shown")
+    lines = make_file()
+    task = "Change the text that Widget17 renders to hello world"
+    assert "widget17" in task_terms(task), "Component names should be search terms"
+    windows = relevant_windows(lines, task, max_lines=100)
+    shown = sum(end - start for start, end in windows)
+    assert shown < 100, f"Too many lines shown: {shown}"
+    rendered = render_windows(lines, windows)
+    target = lines.index("export function Widget17() {")
+    assert f"{target + 1:3}: export function Widget17() {{" in rendered, "Shown lines keep their original number"
+    assert "Widget3()" not in rendered, "Unrelated components should not be shown"
+    assert "not shown" in rendered, "Skipped regions should be marked"
+    print("Passed: only the relevant component is shown")
+
+def test_small_or_unmatched_files_shown_whole():
+    print("\nTesting: small files and files without matches are shown whole")
+    lines = make_file(components=2)
+    assert relevant_windows(lines, "Change Widget1", max_lines=100) == [(0, len(lines))], "Small files are shown whole"
+    lines = make_file()
+    assert relevant_windows(lines, "Rename the footer", max_lines=100) == [(0, len(lines))], \
+        "Without any match the whole file is shown"
+    print("Passed: small files and files without matches are shown whole")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_windows_keep_relevant_chunk()
+    test_small_or_unmatched_files_shown_whole()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
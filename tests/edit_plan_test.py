@@ -0,0 +1,38 @@
+from agents.coding_agent.edit_plan import parse_edit_plan, validate_edit_plan, apply_edit_plan
+
+FILE = "import os\n\ndef main():\n    print('hi')\n    return 0\n"
+
+def test_apply_multiple_hunks():
+    print("\nTesting: several hunks applied in one pass")
+    response = ('Here is the plan:\n```json\n{"hunks": ['
+                '{"start_line": 1, "end_line": 1, "action": "add_after", "content": "import sys"},'
+                '{"start_line": 4, "end_line": 4, "action": "replace", "content": "    print(\'hello world\')"},'
+                '{"start_line": 5, "end_line": 5, "action": "delete", "content": ""}]}\n```')
+    total_lines = len(FILE.split('\n'))
+    hunks = validate_edit_plan(parse_edit_plan(response), total_lines)
+    assert hunks is not None, "The plan should be valid"
+    result = apply_edit_plan(FILE, hunks)
+    assert result == "import os\nimport sys\n\ndef main():\n    print('hello world')\n", f"Unexpected result {result!r}"
+    print("Passed: several hunks applied in one pass")
+
+def test_rejects_invalid_plans():
+    print("\nTesting: invalid plans are rejected")
+    total_lines = len(FILE.split('\n'))
+    assert parse_edit_plan("no plan here") is None, "A response without JSON has no plan"
+    out_of_range = [{"start_line": 9, "end_line": 9, "action": "replace", "content": "x"}]
+    assert validate_edit_plan(out_of_range, total_lines) is None, "Hunks past the end of the file are invalid"
+    overlapping = [{"start_line": 2, "end_line": 4, "action": "replace", "content": "x"},
+                   {"start_line": 4, "end_line": 4, "action": "add_after", "content": "y"}]
+    assert validate_edit_plan(overlapping, total_lines) is None, "Overlapping hunks are invalid"
+    unknown = [{"start_line": 1, "end_line": 1, "action": "rewrite", "content": "x"}]
+    assert validate_edit_plan(unknown, total_lines) is None, "Unknown actions are invalid"
+    print("Passed: invalid plans are rejected")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_apply_multiple_hunks()
+    test_rejects_invalid_plans()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from shared.file_tools import PathIndex
+from shared.github_tools import repo_to_fileTree
+
+FILE_TREE = """
+        SWE-Agent-test/
+        ├─ app/
+        │  ├─ page.tsx
+        │  └─ layout.tsx
+        ├─ components/
+        │  └─ page.tsx
+        ├─ src/
+        │  └─ utils.py
+        └─ README.md
+"""
+
+def test_path_index_from_file_tree():
+    print("\nTesting: PathIndex from an ASCII file tree")
+    index = PathIndex.from_file_tree(FILE_TREE, root="SWE-Agent-test")
+    assert index.paths == {"app/page.tsx", "app/layout.tsx", "components/page.tsx", "src/utils.py", "README.md"}, \
+        f"Unexpected paths {index.paths}"
+    assert index.lookup("./app/page.tsx") == "app/page.tsx", "Paths should be normalized"
+    assert index.lookup("SWE-Agent-test/src/utils.py") == "src/utils.py", "The repository root should be stripped"
+    assert index.lookup("utils.py") == "src/utils.py", "A unique file name should match its file"
+    assert index.lookup("page.tsx") is None, "A file name shared by two files is ambiguous"
+    assert index.lookup("lib/utils.py") is None, "Only the file name matching is not enough"
+    assert "app/new.tsx" not in index, "Missing files should not be found"
+    print("Passed: PathIndex from an ASCII file tree")
+
+def test_path_index_keeps_top_directory():
+    print("\nTesting: PathIndex keeps a top directory that is not the repository")
+    index = PathIndex.from_file_tree("app/\n  page.tsx\n  layout.tsx", root="SWE-Agent-test")
+    assert index.paths == {"app/page.tsx", "app/layout.tsx"}, f"Unexpected paths {index.paths}"
+    assert index.lookup("app/page.tsx") == "app/page.tsx", "app/ is a directory of the repository"
+    index = PathIndex.from_file_tree(FILE_TREE)
+    assert index.lookup("SWE-Agent-test/src/utils.py") == "SWE-Agent-test/src/utils.py", \
+        "Without the repository's name the top line is a directory"
+    index = PathIndex.from_file_tree("src/\n├── +page.svelte\n└── +layout.svelte")
+    assert index.lookup("src/+page.svelte") == "src/+page.svelte", "Only box-drawing connectors are stripped"
+    print("Passed: PathIndex keeps a top directory that is not the repository")
+
+def test_path_index_from_run_agent_tree():
+    print("\nTesting: PathIndex from the plain listing run_agent uses")
+    file_tree = """
+                    app/
+                    page.tsx
+                    notrelevant.tsx
+                """
+    index = PathIndex.from_file_tree(file_tree)
+    assert index.paths == {"app/page.tsx", "app/notrelevant.tsx"}, f"Unexpected paths {index.paths}"
+    assert index.lookup("app/page.tsx") == "app/page.tsx", "app/page.tsx should be routed to modify"
+    assert index.lookup("page.tsx") == "app/page.tsx", "A unique file name should match its file"
+    print("Passed: PathIndex from the plain listing run_agent uses")
+
+def test_path_index_matches_directory():
+    print("\nTesting: PathIndex from a directory and its file tree")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in ("app/page.tsx", "app/api/route.ts", "app/+page.svelte", "package.json"):
+            os.makedirs(os.path.dirname(os.path.join(tmp_dir, path)), exist_ok=True)
+            open(os.path.join(tmp_dir, path), "w").close()
+        from_directory = PathIndex.from_directory(tmp_dir)
+        from_tree = PathIndex.from_file_tree(repo_to_fileTree(tmp_dir), root=os.path.basename(tmp_dir))
+        assert from_directory.paths == {"app/page.tsx", "app/api/route.ts", "app/+page.svelte", "package.json"}, \
+            f"Unexpected paths {from_directory.paths}"
+        assert from_tree.paths == from_directory.paths, f"Tree and directory differ: {from_tree.paths}"
+        from_directory.add("app/new.tsx")
+        assert from_directory.lookup("new.tsx") == "app/new.tsx", "Added files should be found"
+    print("Passed: PathIndex from a directory and its file tree")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_path_index_from_file_tree()
+    test_path_index_keeps_top_directory()
+    test_path_index_from_run_agent_tree()
+    test_path_index_matches_directory()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+from agents.history import ConversationHistory, estimate_tokens
+
+def turn(i):
+    return [{"role": "user", "content": f"question {i} " * 20}, {"role": "assistant", "content": f"answer {i} " * 20}]
+
+def test_history_stays_within_budget():
+    print("\nTesting: token budget")
+    history = ConversationHistory("You are a helpful assistant", max_tokens=500)
+    for i in range(200):
+        history.append(*turn(i))
+        assert history.tokens <= 500, f"History grew to {history.tokens} tokens after {i + 1} turns"
+    assert history.tokens == sum(estimate_tokens(message) for message in history.messages()), \
+        "Running token count should match the messages"
+    assert history.messages()[0]["role"] == "system", "pinned_system should keep the system prompt"
+    assert history.messages()[-1]["content"].startswith("answer 199"), "Latest turn should be kept"
+    print("Passed: token budget")
+
+def test_sliding_window_drops_system_prompt():
+    print("\nTesting: sliding_window")
+    history = ConversationHistory("You are a helpful assistant", max_tokens=200, strategy="sliding_window")
+    for i in range(10):
+        history.append(*turn(i))
+    assert all(message["role"] != "system" for message in history.messages()), "Oldest messages should be dropped"
+    assert history.messages({"role": "user", "content": "next"})[-1]["content"] == "next", "Extra messages are sent last"
+    print("Passed: sliding_window")
+
+def test_summarize_oldest():
+    print("\nTesting: summarize_oldest")
+    summarized = []
+    def summarizer(messages):
+        summarized.append(len(messages))
+        return "the user asked questions"
+    history = ConversationHistory("You are a helpful assistant", max_tokens=500, strategy="summarize_oldest",
+                                  summarizer=summarizer)
+    for i in range(20):
+        history.append(*turn(i))
+    assert summarized, "Summarizer should run once the budget is exceeded"
+    assert history.messages()[1]["content"].startswith("Summary of the earlier conversation"), \
+        "Summary should follow the system prompt"
+    assert history.tokens <= 500, f"History grew to {history.tokens} tokens"
+    print("Passed: summarize_oldest")
+
+def test_failed_summary_keeps_turns_until_dropped():
+    print("\nTesting: summarize_oldest with a failing summarizer")
+    seen = []
+    def summarizer(messages):
+        seen.append(len(history.messages()))
+        raise RuntimeError("model unavailable")
+    history = ConversationHistory("You are a helpful assistant", max_tokens=500, strategy="summarize_oldest",
+                                  summarizer=summarizer)
+    for i in range(20):
+        history.append(*turn(i))
+    assert seen and all(count > 3 for count in seen), "Turns should still be there while summarizing"
+    assert history.tokens <= 500, f"History grew to {history.tokens} tokens"
+    assert history.messages()[0]["role"] == "system", "The fallback should keep the system prompt"
+    assert history.messages()[-1]["content"].startswith("answer 19"), "Latest turn should be kept"
+    print("Passed: summarize_oldest with a failing summarizer")
+
+def test_summary_outside_the_history():
+    print("\nTesting: summarizing outside the history")
+    history = ConversationHistory("You are a helpful assistant", max_tokens=500, strategy="summarize_oldest",
+                                  summarizer=lambda messages: "unused")
+    for i in range(6):
+        history.append(*turn(i), trim=False)
+    oldest = history.oldest_turns()
+    assert len(oldest) == 6, f"Half of the turns should be summarized, got {len(oldest)}"
+    assert history.replace_oldest(oldest, "the user asked questions"), "Summary should replace the turns"
+    assert not history.replace_oldest(oldest, "again"), "Turns that were already replaced stay replaced"
+    history.trim(summarize=False)
+    assert history.messages()[1]["content"].startswith("Summary of the earlier conversation")
+    assert history.tokens == sum(estimate_tokens(message) for message in history.messages()), \
+        "Running token count should match the messages"
+    print("Passed: summarizing outside the history")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_history_stays_within_budget()
+    test_sliding_window_drops_system_prompt()
+    test_summarize_oldest()
+    test_failed_summary_keeps_turns_until_dropped()
+    test_summary_outside_the_history()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
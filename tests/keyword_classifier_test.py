@@ -0,0 +1,35 @@
+from agents.assignment_agent.keyword_classifier import KeywordClassifier
+
+def test_predict_obvious_tasks():
+    print("\nTesting: KeywordClassifier.predict")
+    classifier = KeywordClassifier()
+
+    category, confidence = classifier.predict("Set up PostgreSQL database schema for product inventory")
+    assert category == "thinking_model" and confidence > 0.9, f"Expected confident thinking_model, got {category} {confidence}"
+
+    category, confidence = classifier.predict("Build responsive homepage layout in Tailwind CSS")
+    assert category == "regular_model" and confidence > 0.9, f"Expected confident regular_model, got {category} {confidence}"
+
+    _, confidence = classifier.predict("Do the thing")
+    assert confidence == 0.5, f"Unknown words should give no confidence, got {confidence}"
+    print("Passed: KeywordClassifier.predict")
+
+def test_fit_learns_new_words():
+    print("\nTesting: KeywordClassifier.fit")
+    classifier = KeywordClassifier(weights={})
+    classifier.fit({
+        "regular_model": [{"id": 1, "description": "Polish the carousel"}],
+        "thinking_model": [{"id": 2, "description": "Shard the ledger"}, {"id": 3, "description": "Replicate the ledger"}],
+    })
+    assert classifier.predict("Rebuild the ledger")[0] == "thinking_model", "Expected learned thinking_model word"
+    assert classifier.predict("Animate the carousel")[0] == "regular_model", "Expected learned regular_model word"
+    print("Passed: KeywordClassifier.fit")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_predict_obvious_tasks()
+    test_fit_learns_new_words()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
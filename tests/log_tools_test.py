@@ -0,0 +1,53 @@
+import os
+import time
+import tempfile
+import threading
+from shared.log_tools import RunLog, log_interaction, read_log, compact_log, close_logs
+
+def test_concurrent_events_are_not_lost():
+    print("\nTesting: no lost events")
+    path = os.path.join(tempfile.mkdtemp(), "run.jsonl")
+    threads = [threading.Thread(target=lambda t=t: [log_interaction(path, {"thread": t, "task": i}) for i in range(250)])
+               for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    close_logs()
+
+    events = list(read_log(path))
+    assert len(events) == 1000, f"Expected 1000 events, got {len(events)}"
+    assert [event["seq"] for event in events] == list(range(1, 1001)), "Sequence numbers should be monotonic"
+    # all in the same few seconds, the old timestamp keys would have collided
+    assert len(compact_log(path)) == 1000, "Export should keep every event"
+    print("Passed: no lost events")
+
+def test_background_writer_cost_per_event():
+    print("\nTesting: background writer")
+    path = os.path.join(tempfile.mkdtemp(), "run.jsonl")
+    run_log = RunLog(path, background=True)
+    timings = []
+    for i in range(1000):
+        start = time.perf_counter()
+        run_log.write({"task": i})
+        timings.append(time.perf_counter() - start)
+    run_log.close()
+
+    # constant cost, the last events cost about as much as the first ones
+    first, last = sum(timings[:100]), sum(timings[-100:])
+    assert last < first * 5 + 0.01, f"Logging got slower as the log grew: {first:.4f}s vs {last:.4f}s"
+    assert len(list(read_log(path))) == 1000, "Background writer should flush everything on close"
+
+    reopened = RunLog(path)
+    assert reopened.write({"task": "after restart"}) == 1001, "Reopened log should continue the sequence"
+    reopened.close()
+    print("Passed: background writer")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_concurrent_events_are_not_lost()
+    test_background_writer_cost_per_event()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+from agents.backends import FakeBackend
+from agents.node import Node
+
+class FormatBackend(FakeBackend):
+    supports_format = True
+
+def test_parse_choice():
+    print("\nTesting: Node._parse_choice")
+    node = Node("fake", FakeBackend())
+    choices = ["success", "fail"]
+    assert node._parse_choice('{"answer": "success"}', choices) == "success", "JSON answers are read"
+    assert node._parse_choice(' "Fail". ', choices) == "fail", "Bare answers are read"
+    assert node._parse_choice('{ "answer" : "succ', choices) == "success", "Cut off answers that start one choice"
+    assert node._parse_choice('{ "answer" : "', choices) is None, "An empty cut off answer is no choice"
+    assert node._parse_choice("The script ran, so: success", choices) == "success", "A choice inside text"
+    assert node._parse_choice("either success or fail", choices) is None, "Two choices are ambiguous"
+    assert node._parse_choice("unsuccessful", choices) is None, "Choices only count as whole words"
+    assert node._parse_choice("I would pick a C here", ["A", "B", "C"]) == "C", "Single letters keep their case"
+    print("Passed: Node._parse_choice")
+
+def test_constrained_leaves_room_for_json():
+    print("\nTesting: Node._constrained token caps")
+    plain = Node("fake", FakeBackend())._constrained(["A", "B"], max_tokens=8)
+    assert plain["options"]["num_predict"] == 8 and plain["options"]["stop"] == ["\n"], f"Unexpected kwargs {plain}"
+    schema = Node("fake", FormatBackend())._constrained(["A", "B"], max_tokens=8)
+    assert "format" in schema and schema["options"]["num_predict"] >= 16, \
+        f"The JSON object needs more tokens than the bare answer, got {schema['options']}"
+    print("Passed: Node._constrained token caps")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_parse_choice()
+    test_constrained_leaves_room_for_json()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+from shared.patch_tools import parse_patch, apply_patch, apply_patch_to_files
+
+FILE = "import os\n\ndef main():\n    print('hi')\n    return 0\n\nif __name__ == '__main__':\n    main()\n"
+
+def test_unified_diff():
+    print("\nTesting: unified diff with several hunks")
+    patch = ("--- a/main.py\n+++ b/main.py\n"
+             "@@ -1,0 +2,1 @@\n+import sys\n"
+             "@@ -4,2 +5,3 @@\n     print('hi')\n-    return 0\n+    print('world')\n+    return 1\n")
+    hunks = parse_patch(patch)
+    assert len(hunks) == 2 and hunks[0]["path"] == "main.py", f"Unexpected hunks {hunks}"
+    result, rejections = apply_patch(FILE, hunks)
+    assert not rejections, f"Unexpected rejections {rejections}"
+    assert result == FILE.replace("import os\n", "import os\nimport sys\n").replace(
+        "    return 0", "    print('world')\n    return 1"), f"Unexpected result {result!r}"
+    print("Passed: unified diff with several hunks")
+
+def test_search_replace_fuzzy():
+    print("\nTesting: SEARCH/REPLACE with context that is slightly off")
+    patch = ('<<<<<<< SEARCH\ndef main():\n  print("hi")\n=======\ndef main(argv):\n    print("hi")\n>>>>>>> REPLACE\n')
+    result, rejections = apply_patch(FILE, parse_patch(patch))
+    assert not rejections, f"Unexpected rejections {rejections}"
+    assert "def main(argv):" in result and result.count("print") == 1, f"Unexpected result {result!r}"
+    print("Passed: SEARCH/REPLACE with context that is slightly off")
+
+def test_indented_markers():
+    print("\nTesting: SEARCH/REPLACE markers indented like the prompt")
+    indent = " " * 24
+    patch = (f"{indent}<<<<<<< SEARCH\n{indent}    return 0\n{indent}=======\n{indent}    return 1\n"
+             f"{indent}>>>>>>> REPLACE\n")
+    hunks = parse_patch(patch)
+    assert hunks and hunks[0]["new"] == ["    return 1"], f"Indented markers should be found, got {hunks}"
+    result, rejections = apply_patch(FILE, hunks)
+    assert not rejections and "    return 1\n" in result, f"Unexpected result {result!r} {rejections}"
+    print("Passed: SEARCH/REPLACE markers indented like the prompt")
+
+def test_removed_comment_lines_in_diff():
+    print("\nTesting: removed -- comment lines are not file headers")
+    sql = "SELECT 1;\n-- old comment\n-- another\nSELECT 2;\n"
+    patch = ("--- a/q.sql\n+++ b/q.sql\n@@ -1,4 +1,3 @@\n SELECT 1;\n--- old comment\n--- another\n"
+             "+-- new comment\n SELECT 2;\n")
+    hunks = parse_patch(patch)
+    assert len(hunks) == 1 and hunks[0]["path"] == "q.sql", f"Unexpected hunks {hunks}"
+    result, rejections = apply_patch(sql, hunks)
+    assert not rejections and result == "SELECT 1;\n-- new comment\nSELECT 2;\n", f"Unexpected result {result!r}"
+    print("Passed: removed -- comment lines are not file headers")
+
+def test_insert_into_empty_file():
+    print("\nTesting: an empty SEARCH block fills an empty file")
+    hunks = parse_patch("<<<<<<< SEARCH\n=======\ndef main():\n    return 0\n>>>>>>> REPLACE\n")
+    result, rejections = apply_patch("", hunks)
+    assert not rejections and result == "def main():\n    return 0\n", f"Unexpected result {result!r} {rejections}"
+    result, rejections = apply_patch(FILE, hunks)
+    assert rejections and rejections[0]["reason"] == "insertion without a line number", \
+        "Where to insert into a file with content is unknown"
+    print("Passed: an empty SEARCH block fills an empty file")
+
+def test_atomic_rejection():
+    print("\nTesting: a rejected hunk leaves every file unchanged")
+    directory = tempfile.mkdtemp()
+    for name in ("a.py", "b.py"):
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(FILE)
+    patch = ("a.py\n<<<<<<< SEARCH\n    return 0\n=======\n    return 1\n>>>>>>> REPLACE\n"
+             "b.py\n<<<<<<< SEARCH\nclass Missing:\n    pass\n=======\nclass Found:\n    pass\n>>>>>>> REPLACE\n")
+    results = apply_patch_to_files(patch, directory)
+    assert not results["a.py"] and results["b.py"][0]["reason"] == "no match for the context lines", \
+        f"Unexpected results {results}"
+    for name in ("a.py", "b.py"):
+        with open(os.path.join(directory, name)) as f:
+            assert f.read() == FILE, f"{name} should not have been written"
+    print("Passed: a rejected hunk leaves every file unchanged")
+
+def test_paths_outside_base_rejected():
+    print("\nTesting: patches cannot write outside the base directory")
+    directory = tempfile.mkdtemp()
+    base = os.path.join(directory, "base")
+    os.mkdir(base)
+    for path in ("../evil.txt", os.path.join(directory, "evil.txt")):
+        patch = f"{path}\n<<<<<<< SEARCH\n=======\nevil\n>>>>>>> REPLACE\n"
+        results = apply_patch_to_files(patch, base)
+        assert results[path][0]["reason"] == "path outside the base directory", f"Unexpected results {results}"
+    assert not os.path.exists(os.path.join(directory, "evil.txt")), "Nothing should be written outside the base"
+    print("Passed: patches cannot write outside the base directory")
+
+def test_create_in_new_directory():
+    print("\nTesting: a patch creates a file in a new directory")
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, "a.py"), "w") as f:
+        f.write(FILE)
+    patch = ("a.py\n<<<<<<< SEARCH\n    return 0\n=======\n    return 1\n>>>>>>> REPLACE\n"
+             "newdir/sub/b.py\n<<<<<<< SEARCH\n=======\nB = 1\n>>>>>>> REPLACE\n")
+    results = apply_patch_to_files(patch, directory)
+    assert results == {"a.py": [], "newdir/sub/b.py": []}, f"Unexpected results {results}"
+    with open(os.path.join(directory, "newdir", "sub", "b.py")) as f:
+        assert f.read() == "B = 1\n", "The new file should be written"
+
+    # a file that cannot be written leaves the others unchanged and is reported, not raised
+    with open(os.path.join(directory, "blocker"), "w") as f:
+        f.write("")
+    patch = ("a.py\n<<<<<<< SEARCH\n    return 1\n=======\n    return 2\n>>>>>>> REPLACE\n"
+             "blocker/c.py\n<<<<<<< SEARCH\n=======\nC = 1\n>>>>>>> REPLACE\n")
+    results = apply_patch_to_files(patch, directory)
+    assert results["a.py"] and results["blocker/c.py"], f"Every file should be reported, got {results}"
+    with open(os.path.join(directory, "a.py")) as f:
+        assert "    return 1\n" in f.read(), "a.py should not have been written"
+    assert not [name for name in os.listdir(directory) if name.startswith(".patch-")], "Temporary files were left"
+    print("Passed: a patch creates a file in a new directory")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_unified_diff()
+    test_search_replace_fuzzy()
+    test_indented_markers()
+    test_removed_comment_lines_in_diff()
+    test_insert_into_empty_file()
+    test_atomic_rejection()
+    test_paths_outside_base_rejected()
+    test_create_in_new_directory()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from agents.router import ModelRouter, DEFAULT_ROUTES
+
+ROUTES = {
+    "regular": ["small", "medium"],
+    "thinking": ["medium", "large", "xlarge"],
+}
+
+def test_route_by_category_size_and_load():
+    print("\nTesting: ModelRouter.route")
+    router = ModelRouter(ROUTES, large_prompt_tokens=1000, busy_backlog=4)
+    assert router.route("regular") == "small", "Cheap tasks should use the smallest model"
+    assert router.route("thinking") == "medium", "Hard tasks start on their own ladder"
+    assert router.route("any") == "small", "Unknown categories fall back to regular"
+    assert router.route("thinking", prompt_tokens=5000) == "large", "Large prompts start one rung up"
+    assert router.route("thinking", prompt_tokens=5000, load=10) == "medium", "A long queue prefers faster models"
+    assert router.route("regular", load=10) == "small", "Load never goes below the smallest model"
+    assert router.route("regular", attempt=5) == "medium", "Escalation stops at the largest model"
+    print("Passed: ModelRouter.route")
+
+def test_escalate_on_failed_validation():
+    print("\nTesting: ModelRouter.run")
+    router = ModelRouter(ROUTES)
+    tried = []
+    def call(model):
+        tried.append(model)
+        return {"modify": ["app/page.tsx"] if model == "large" else []}
+    result, model = router.run("thinking", call, validate=lambda output: output["modify"])
+    assert tried == ["medium", "large"] and model == "large", f"Unexpected escalation {tried}"
+
+    tried.clear()
+    result, model = router.run("regular", lambda model: tried.append(model) or {}, validate=lambda output: False)
+    assert tried == ["small", "medium"] and model == "medium", "The largest model's result is returned last"
+    print("Passed: ModelRouter.run")
+
+def test_routes_merge_over_defaults():
+    print("\nTesting: ModelRouter routes from a device config")
+    router = ModelRouter({"thinking": ["large"]})
+    assert router.route("thinking") == "large", "Configured ladders replace the default"
+    assert router.route("any") == DEFAULT_ROUTES["regular"][0], "Categories left out keep the default ladder"
+    for routes in ({"regular": []}, {"regular": "small"}, {"regular": ["small", None]}):
+        try:
+            ModelRouter(routes)
+        except ValueError:
+            continue
+        raise AssertionError(f"Invalid routes {routes} should be rejected")
+    print("Passed: ModelRouter routes from a device config")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_route_by_category_size_and_load()
+    test_escalate_on_failed_validation()
+    test_routes_merge_over_defaults()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+from agents.coding_agent.stream_parser import CodeStreamParser
+
+def feed_pieces(parser, text, size):
+    """
+    Feeds the text in pieces of size characters until the parser is done.
+    """
+    for i in range(0, len(text), size):
+        if parser.feed(text[i:i + size]):
+            return
+
+def test_stops_at_end_marker():
+    print("\nTesting: stop at END_CODE")
+    response = "Sure!\nSTART_CODE\nexport default function Page() {}\nEND_CODE\nThis component renders a page..."
+    for size in (1, 3, 7, 16):
+        parser = CodeStreamParser()
+        feed_pieces(parser, response, size)
+        assert parser.done, f"END_CODE split into pieces of {size} should be found"
+        assert parser.code == "export default function Page() {}", f"Unexpected code {parser.code!r}"
+        assert "renders" not in parser.text, "Parsing should stop before the trailing explanation"
+    print("Passed: stop at END_CODE")
+
+def test_cut_off_response():
+    print("\nTesting: response without END_CODE")
+    parser = CodeStreamParser()
+    assert not parser.feed("no markers yet") and parser.code is None, "Nothing before START_CODE is code"
+    parser.feed(" START_CODE\nline 1\nline 2")
+    assert not parser.done and parser.code == "line 1\nline 2", "A cut off response keeps what was generated"
+    print("Passed: response without END_CODE")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_stops_at_end_marker()
+    test_cut_off_response()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+import time
+import multiprocessing
+import zmq
+from orchestrator.dispatcher import TaskDispatcher, encode, decode
+from orchestrator.client import TaskReceiver
+from orchestrator.registry import DeviceRegistry
+from orchestrator.aggregator import ResultAggregator
+from shared.timing_tools import percentile
+
+PORT = 5655
+
+def run_device(device_id, port, results):
+    """
+    Coding device process: collects tasks until the dispatcher sends STOP.
+    """
+    context = zmq.Context()
+    receiver = TaskReceiver(context, "127.0.0.1", port, device_id)
+    received = []
+    while True:
+        task = receiver.recv_task(timeout=10)
+        if task is None:
+            break
+        received.append(task["id"])
+    results.put((device_id, received))
+    receiver.close()
+    context.term()
+
+def test_tasks_delivered_once_to_each_device():
+    print("\nTesting: acknowledged delivery to device processes")
+    context = zmq.Context()
+    dispatcher = TaskDispatcher(context, PORT, ack_timeout=0.5, max_retries=5)
+    results = multiprocessing.Queue()
+    devices = [multiprocessing.Process(target=run_device, args=(str(device_id), PORT, results)) for device_id in (1, 2)]
+    for device in devices:
+        device.start()
+
+    for task_id in range(1, 101):
+        dispatcher.send(str(task_id % 2 + 1), {"id": task_id, "description": f"task {task_id}"})
+        dispatcher.poll()
+    assert dispatcher.wait_for_acks(timeout=10), f"Tasks left unacknowledged: {list(dispatcher.pending)}"
+    dispatcher.stop_devices()
+
+    received = dict(results.get(timeout=10) for _ in devices)
+    for device in devices:
+        device.join(timeout=10)
+    dispatcher.close()
+    context.term()
+
+    assert sorted(received["1"] + received["2"]) == list(range(1, 101)), "Every task should arrive exactly once"
+    assert all(task_id % 2 == 0 for task_id in received["1"]), "Tasks should only reach their own device"
+    print("Passed: acknowledged delivery to device processes")
+
+def test_unacked_task_is_retransmitted():
+    print("\nTesting: retransmit until acknowledged")
+    context = zmq.Context()
+    dispatcher = TaskDispatcher(context, PORT + 1, ack_timeout=0.2, max_retries=3)
+    device = context.socket(zmq.DEALER)
+    device.setsockopt(zmq.ROUTING_ID, b"7")
+    device.connect(f"tcp://127.0.0.1:{PORT + 1}")
+    device.send_multipart(encode("HELLO", {"device_id": "7"}))
+
+    msg_id = dispatcher.send("7", {"id": 1, "description": "task"})
+    copies = 0
+    deadline = time.time() + 5
+    while copies < 2 and time.time() < deadline:
+        dispatcher.poll(50)
+        if device.poll(0):
+            kind, body = decode(device.recv_multipart())
+            if kind == "TASK":
+                copies += 1
+    assert copies == 2, "An unacknowledged task should be sent again"
+
+    device.send_multipart(encode("ACK", {"msg_id": msg_id}))
+    assert dispatcher.wait_for_acks(timeout=5) and msg_id in dispatcher.acked, "Task should be acknowledged"
+    device.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: retransmit until acknowledged")
+
+def test_receiver_suppresses_duplicates():
+    print("\nTesting: TaskReceiver duplicate suppression")
+    context = zmq.Context()
+    router = context.socket(zmq.ROUTER)
+    router.bind(f"tcp://127.0.0.1:{PORT + 2}")
+    receiver = TaskReceiver(context, "127.0.0.1", PORT + 2, "3", heartbeat_interval=None)
+    identity, *hello = router.recv_multipart()
+    assert decode(hello)[0] == "HELLO", "Receiver should introduce itself"
+
+    for _ in range(2):
+        router.send_multipart([identity] + encode("TASK", {"msg_id": "s-1", "task": {"id": 1}}))
+    router.send_multipart([identity] + encode("STOP", {}))
+
+    assert receiver.recv_task(timeout=5) == {"id": 1}, "First copy should be returned"
+    assert receiver.recv_task(timeout=5) is None, "Duplicate should be dropped before STOP"
+    replies = [decode(router.recv_multipart()[1:]) for _ in range(4)]
+    acks = [reply for reply in replies if reply[0] != "READY"]
+    assert acks == [("ACK", {"msg_id": "s-1"})] * 2, f"Both copies should be acknowledged, got {acks}"
+    receiver.close()
+    router.close()
+    context.term()
+    print("Passed: TaskReceiver duplicate suppression")
+
+def run_slow_device(device_id, port, delay, results):
+    """
+    Coding device process that pulls tasks and takes delay seconds on each.
+    """
+    context = zmq.Context()
+    receiver = TaskReceiver(context, "127.0.0.1", port, device_id, model_type="thinking")
+    received = []
+    while True:
+        task = receiver.recv_task(timeout=10)
+        if task is None:
+            break
+        time.sleep(delay)
+        received.append(task["id"])
+        receiver.task_done()
+    results.put((device_id, received))
+    receiver.close()
+    context.term()
+
+def test_idle_devices_pull_work():
+    print("\nTesting: pull-based scheduling")
+    context = zmq.Context()
+    dispatcher = TaskDispatcher(context, PORT + 3, ack_timeout=0.5)
+    results = multiprocessing.Queue()
+    devices = [multiprocessing.Process(target=run_slow_device, args=(device_id, PORT + 3, delay, results))
+               for device_id, delay in (("fast", 0.01), ("slow", 0.2))]
+    for device in devices:
+        device.start()
+
+    for task_id in range(1, 41):
+        dispatcher.submit({"id": task_id, "description": f"task {task_id}"}, "regular")
+    assert dispatcher.wait_until_done(timeout=20), "Every queued task should be completed"
+    dispatcher.stop_devices()
+
+    received = dict(results.get(timeout=10) for _ in devices)
+    for device in devices:
+        device.join(timeout=10)
+    dispatcher.close()
+    context.term()
+
+    assert sorted(received["fast"] + received["slow"]) == list(range(1, 41)), "Every task should run exactly once"
+    assert len(received["fast"]) > len(received["slow"]), f"The fast device should pull more work, got {received}"
+    print("Passed: pull-based scheduling")
+
+def pull(dispatcher, receiver, timeout=5):
+    """
+    Serves the dispatcher while a receiver in the same process waits for a task.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        dispatcher.poll(20)
+        task = receiver.recv_task(timeout=0.02)
+        if task is not None:
+            return task
+    return None
+
+def test_timed_out_task_is_reassigned():
+    print("\nTesting: reassign on task timeout")
+    context = zmq.Context()
+    dispatcher = TaskDispatcher(context, PORT + 4, ack_timeout=0.5, task_timeout=0.3)
+    stuck = TaskReceiver(context, "127.0.0.1", PORT + 4, "stuck")
+    msg_id = dispatcher.submit({"id": 1, "description": "task"}, "regular")
+    assert pull(dispatcher, stuck) == {"id": 1, "description": "task"}, "First device should get the task"
+
+    # the first device never finishes, so the task moves to the next device that asks
+    helper = TaskReceiver(context, "127.0.0.1", PORT + 4, "helper")
+    assert pull(dispatcher, helper) == {"id": 1, "description": "task"}, "Timed out task should be reassigned"
+    helper.task_done()
+    assert dispatcher.wait_until_done(timeout=5), "Reassigned task should complete"
+    assert dispatcher.completed[msg_id]["device_id"] == "helper", "Helper should complete the task"
+
+    stuck.close()
+    helper.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: reassign on task timeout")
+
+def test_dead_device_loses_its_task():
+    print("\nTesting: heartbeat expiry")
+    context = zmq.Context()
+    registry = DeviceRegistry(expiry=0.5)
+    dispatcher = TaskDispatcher(context, PORT + 5, ack_timeout=0.2, registry=registry)
+    dead = TaskReceiver(context, "127.0.0.1", PORT + 5, "dead", heartbeat_interval=None)
+    msg_id = dispatcher.submit({"id": 1, "description": "task"}, "regular")
+    assert pull(dispatcher, dead) == {"id": 1, "description": "task"}, "First device should get the task"
+    assert registry.is_alive("dead"), "Device should be alive right after talking to the dispatcher"
+
+    # this device keeps sending heartbeats, the first one went silent
+    alive = TaskReceiver(context, "127.0.0.1", PORT + 5, "alive", heartbeat_interval=0.1,
+                         status=lambda: {"model": "cogito:3b"})
+    assert pull(dispatcher, alive) == {"id": 1, "description": "task"}, "Task of the dead device should move"
+    assert not registry.is_alive("dead") and registry.is_alive("alive"), "Only the silent device should expire"
+    assert registry.status("alive")["model"] == "cogito:3b", "Heartbeat status should reach the registry"
+    alive.task_done()
+    assert dispatcher.wait_until_done(timeout=5), "Moved task should complete"
+
+    dead.close()
+    alive.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: heartbeat expiry")
+
+def test_ready_device_is_not_saturated():
+    print("\nTesting: READY clears the reported queue depth")
+    context = zmq.Context()
+    registry = DeviceRegistry(expiry=30)
+    dispatcher = TaskDispatcher(context, PORT + 7, ack_timeout=0.5, registry=registry)
+    # heartbeats are slow, so the queue depth of the first task is still reported when READY arrives
+    receiver = TaskReceiver(context, "127.0.0.1", PORT + 7, "1", heartbeat_interval=30)
+    for i in range(2):
+        dispatcher.submit({"id": i, "description": f"task {i}"}, "regular")
+    assert pull(dispatcher, receiver) == {"id": 0, "description": "task 0"}, "First task should arrive"
+    registry.update("1", {"queue_depth": 1})
+    receiver.task_done()
+    start = time.time()
+    assert pull(dispatcher, receiver, timeout=1) == {"id": 1, "description": "task 1"}, "Second task should arrive"
+    assert time.time() - start < 0.5, "READY should not wait for the next heartbeat"
+    receiver.task_done()
+    assert dispatcher.wait_until_done(timeout=5), "All tasks should complete"
+
+    receiver.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: READY clears the reported queue depth")
+
+def test_returning_device_is_stopped():
+    print("\nTesting: an expired device that comes back gets STOP")
+    context = zmq.Context()
+    registry = DeviceRegistry(expiry=0.3)
+    dispatcher = TaskDispatcher(context, PORT + 8, ack_timeout=0.5, registry=registry)
+    receiver = TaskReceiver(context, "127.0.0.1", PORT + 8, "1", heartbeat_interval=None)
+    dispatcher.submit({"id": 1, "description": "task"}, "regular")
+    assert pull(dispatcher, receiver) == {"id": 1, "description": "task"}, "Device should get the task"
+    dispatcher.poll(100)  # the ACK
+    time.sleep(0.4)
+    dispatcher.poll()
+    assert "1" not in dispatcher.connected, "Silent device should expire"
+
+    # the device was only slow, it finishes the task and asks for the next one
+    receiver.task_done()
+    assert receiver.recv_task(timeout=0.2) is None, "There is no other task"
+    dispatcher.poll(100)
+    assert "1" in dispatcher.connected, "Device should be connected again"
+    dispatcher.stop_devices()
+    start = time.time()
+    assert receiver.recv_task(timeout=2) is None and time.time() - start < 1, "STOP should reach the device"
+
+    receiver.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: an expired device that comes back gets STOP")
+
+def test_unacknowledged_device_gets_work_when_idle():
+    print("\nTesting: a device whose TASK was never acknowledged gets work once it is idle")
+    context = zmq.Context()
+    dispatcher = TaskDispatcher(context, PORT + 9, ack_timeout=0.1, max_retries=1)
+    device = context.socket(zmq.DEALER)
+    device.setsockopt(zmq.ROUTING_ID, b"7")
+    device.connect(f"tcp://127.0.0.1:{PORT + 9}")
+    device.send_multipart(encode("HELLO", {"device_id": "7"}))
+    device.send_multipart(encode("READY", {}))
+    msg_id = dispatcher.submit({"id": 1, "description": "task"}, "regular")
+
+    def drain(seconds):
+        received = []
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            dispatcher.poll(20)
+            while device.poll(0):
+                received.append(decode(device.recv_multipart()))
+        return received
+
+    # every ACK is lost until the dispatcher gives up on the task
+    drain(1)
+    assert msg_id not in dispatcher.in_flight, "The task should go back to the queue"
+    # the device may still be working on it, so it gets nothing new while its heartbeat says it is busy
+    device.send_multipart(encode("HEARTBEAT", {"device_id": "7", "queue_depth": 1}))
+    assert not drain(0.3) and msg_id not in dispatcher.in_flight, "A busy device should get no other task"
+
+    device.send_multipart(encode("HEARTBEAT", {"device_id": "7", "queue_depth": 0}))
+    received = drain(0.3)
+    assert received and received[0][0] == "TASK" and received[0][1]["msg_id"] == msg_id, \
+        f"The idle device should get the task again, got {received}"
+    device.send_multipart(encode("ACK", {"msg_id": msg_id}))
+    device.send_multipart(encode("DONE", {"msg_id": msg_id, "status": "success"}))
+    assert dispatcher.wait_until_done(timeout=5), "The task should complete"
+    device.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: a device whose TASK was never acknowledged gets work once it is idle")
+
+def test_wait_until_done_gives_up_without_devices():
+    print("\nTesting: waiting for tasks without devices")
+    context = zmq.Context()
+    dispatcher = TaskDispatcher(context, PORT + 10)
+    dispatcher.submit({"id": 1, "description": "task"}, "regular")
+    start = time.time()
+    assert not dispatcher.wait_until_done(stall_timeout=0.3), "Nothing can finish the task"
+    assert time.time() - start < 2, "Waiting should stop once nothing was done for stall_timeout"
+    assert dispatcher.unfinished() == [{"id": 1, "description": "task"}], "The task should be reported unfinished"
+    dispatcher.close()
+    context.term()
+    print("Passed: waiting for tasks without devices")
+
+def test_results_reach_the_aggregator():
+    print("\nTesting: result aggregation")
+    context = zmq.Context()
+    aggregator = ResultAggregator()
+    dispatcher = TaskDispatcher(context, PORT + 6, on_result=aggregator.add)
+    receiver = TaskReceiver(context, "127.0.0.1", PORT + 6, "1", heartbeat_interval=None)
+    for i in range(3):
+        dispatcher.submit({"id": i, "description": f"task {i}"}, "regular")
+    for i in range(3):
+        task = pull(dispatcher, receiver)
+        receiver.task_done(status="fail" if i == 2 else "success",
+                           result={"analysis": {"modify": ["app/page.tsx"], "create": []},
+                                   "diffs": {"app/page.tsx": "+hello"}, "timings": {"duration": 0.1}})
+    assert dispatcher.wait_until_done(timeout=5), "All tasks should complete"
+
+    assert [result["task_id"] for result in aggregator.results] == [0, 1, 2], "Results should arrive in order"
+    assert aggregator.results[0]["diffs"] == {"app/page.tsx": "+hello"}, "Diffs should reach the orchestrator"
+    assert all(result["device_id"] == "1" and result["latency"] >= 0 for result in aggregator.results)
+    summary = aggregator.summary()
+    assert summary["results"] == 3 and summary["failed"] == 1, f"Unexpected summary {summary}"
+    assert summary["latency_p50"] <= summary["latency_p95"] <= summary["latency_p99"]
+    assert percentile([5, 1, 4, 2, 3], 50) == 3 and percentile([], 99) is None
+
+    receiver.close()
+    dispatcher.close()
+    context.term()
+    print("Passed: result aggregation")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_tasks_delivered_once_to_each_device()
+    test_unacked_task_is_retransmitted()
+    test_receiver_suppresses_duplicates()
+    test_idle_devices_pull_work()
+    test_timed_out_task_is_reassigned()
+    test_dead_device_loses_its_task()
+    test_results_reach_the_aggregator()
+    test_ready_device_is_not_saturated()
+    test_returning_device_is_stopped()
+    test_unacknowledged_device_gets_work_when_idle()
+    test_wait_until_done_gives_up_without_devices()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import time
+import tempfile
+from shared.log_tools import close_logs
+from shared.timing_tools import span, timed, set_span_log, summarize_log, recent_spans, span_labels, record_tokens, summarize_usage
+
+@timed("test")
+def slow_step(delay):
+    """
+    Sleeps for delay seconds.
+    """
+    time.sleep(delay)
+    return delay
+
+def test_spans_are_logged_and_summarized():
+    print("\nTesting: span logging and summary")
+    path = os.path.join(tempfile.mkdtemp(), "run.jsonl")
+    set_span_log(path)
+    try:
+        for _ in range(5):
+            slow_step(0.01)
+        with span("test", "chat", model="cogito:3b") as record:
+            record["prompt_tokens"] = 12
+        try:
+            with span("test", "failing"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    finally:
+        set_span_log("")
+        close_logs()
+
+    assert slow_step.__name__ == "slow_step" and "Sleeps" in slow_step.__doc__, "timed should keep the signature"
+    assert recent_spans()[-1]["error"] == "boom", "Errors should be recorded on the span"
+    summary = summarize_log(path)
+    assert summary["test.slow_step"]["count"] == 5, f"Unexpected summary {summary}"
+    assert summary["test.slow_step"]["p50"] >= 0.01, "Durations should cover the timed call"
+    assert list(summary)[0] == "test.slow_step", "Slowest stage should come first"
+    assert summary["test.chat"]["count"] == 1 and summary["test.failing"]["count"] == 1
+    print("Passed: span logging and summary")
+
+def test_token_usage_rolls_up_by_label():
+    print("\nTesting: token usage roll-up")
+    response = {"prompt_eval_count": 100, "eval_count": 20, "load_duration": 5e8, "eval_duration": 1e9}
+    spans = []
+    for task_id in (1, 1, 2):
+        with span_labels(task_id=task_id):
+            with span("CodingAgent", "analyze_task", model="cogito:3b") as record:
+                record_tokens(record, response)
+        spans.append(record)
+    with span("CodingAgent", "no_llm_call") as record:
+        pass
+    spans.append(record)
+
+    assert spans[0]["tokens_per_sec"] == 20 and spans[0]["load_time"] == 0.5, f"Unexpected span {spans[0]}"
+    per_task = summarize_usage(spans, by="task_id")
+    assert list(per_task) == ["1", "2"], "Spans without tokens should be skipped, busiest task first"
+    assert per_task["1"]["calls"] == 2 and per_task["1"]["prompt_tokens"] == 200 and per_task["1"]["response_tokens"] == 40
+    assert summarize_usage(spans, by="model")["cogito:3b"]["tokens_per_sec"] == 20
+    print("Passed: token usage roll-up")
+
+def main():
+    print("\nRunning all tests...\n")
+    test_spans_are_logged_and_summarized()
+    test_token_usage_rolls_up_by_label()
+    print("\nAll tests completed successfully!")
+
+if __name__ == '__main__':
+    main()